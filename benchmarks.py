@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+"""Microbenchmarks for the NoisyNeighbors real-time hot paths.
+
+Runs without audio hardware and writes a JSON file that can be compared
+between versions:
+
+    python3 benchmarks.py --output bench_new.json --compare bench_old.json
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import platform
+import argparse
+import tempfile
+from datetime import datetime, timedelta
+
+import numpy as np
+
+import noisyneighbors as nn
+
+BLOCK_SIZES = [256, 512, 1024, 2048]
+SAMPLE_RATES = [16000, 44100, 48000]
+OUTPUT_SR = 48000
+
+
+def measure(fn, min_time=0.2, repeat=5):
+    """Time ``fn()``; returns per-call seconds (best, median) over ``repeat`` runs."""
+    fn()
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time / repeat or number >= 1 << 20:
+            break
+        number *= 2
+    runs = [elapsed / number]
+    for _ in range(repeat - 1):
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        runs.append((time.perf_counter() - start) / number)
+    runs.sort()
+    return runs[0], runs[len(runs) // 2], number
+
+
+def make_audio(seconds, sr, channels=1, seed=0):
+    rng = np.random.default_rng(seed)
+    return (rng.standard_normal((int(seconds * sr), channels)) * 0.05).astype(np.float32)
+
+
+def make_history(n):
+    now = datetime.now()
+    history = []
+    for i in range(n):
+        dt = now - timedelta(minutes=7 * i)
+        history.append({
+            "date": str(dt.date()),
+            "time": dt.strftime("%H:%M:%S"),
+            "rms": 0.2,
+            "duration": 2.5,
+        })
+    history.reverse()
+    return history
+
+
+def bench_block(block_size, sr):
+    """Per-block detector work."""
+    block = make_audio(block_size / sr, sr)
+    ring = nn.RingBuffer(int(sr * nn.RING_SECONDS), 1)
+    queue = nn.BlockQueue(nn.BLOCK_QUEUE_SLOTS, block_size, 1)
+    lowfreq = nn.LowFreqDetector(sr)
+    sliding = nn.SlidingRmsDetector(sr, 20, 5)
+    noise = nn.NoiseFloorTracker()
+    nn.state["sample_rate"] = sr
+    nn.refresh_detector_params()
+
+    def handoff():
+        queue.push(block)
+        queue.pop()
+        queue.release()
+
+    stage_seconds = nn.RESPONSE_SECONDS.labels(stage="bench")
+
+    def params_lookup():
+        p = nn.state["detector_params"]
+        return p.threshold, p.pre_samples, p.post_samples
+
+    return {
+        "rms": lambda: nn.rms(block),
+        "detector_sliding_rms": lambda: sliding.detect(block, 1.0),
+        "detector_lowfreq": lambda: lowfreq.process(block),
+        "noise_floor_update": lambda: noise.update(0.01, block_size / sr),
+        "ring_write": lambda: ring.write(block),
+        "block_handoff": handoff,
+        "detector_params_lookup": params_lookup,
+        "detector_params_rebuild": nn.refresh_detector_params,
+        "metrics_observe": lambda: stage_seconds.observe(1e-4),
+    }
+
+
+def bench_event(sr):
+    """Per-boom work: assembly, playback preparation and recording."""
+    ring = nn.RingBuffer(int(sr * nn.RING_SECONDS), 1)
+    ring.write(make_audio(nn.RING_SECONDS, sr))
+    params = nn.build_detector_params(nn.state["config"], sr)
+    n = params.pre_samples + params.post_samples
+    start = ring.total - n
+    boom = ring.read(start, n).copy().flatten()
+
+    def assemble():
+        audio = ring.read(start, n).copy()
+        return audio.flatten()
+
+    def resample_normalize():
+        gain = np.float32(1.0 / np.max(np.abs(boom)))
+        for chunk in nn.iter_resampled(boom, sr, OUTPUT_SR):
+            nn.to_stereo(np.clip(chunk * gain, -1.0, 1.0))
+
+    stereo = nn.to_stereo(nn.resample(boom, sr, OUTPUT_SR))
+
+    def encode_int16():
+        return (np.clip(stereo, -1.0, 1.0) * 32767).astype(np.int16).tobytes()
+
+    def save_as(fmt, rate=None):
+        cfg = dict(nn.state["config"], recording_format=fmt, recording_sample_rate=rate)
+
+        def save():
+            saved, nn.state["config"] = nn.state["config"], cfg
+            try:
+                nn.save_recording(boom, sr)
+            finally:
+                nn.state["config"] = saved
+        return save
+
+    return {
+        "boom_assembly": assemble,
+        "play_resample_normalize": resample_normalize,
+        "play_encode_int16": encode_int16,
+        "save_recording": save_as("wav"),
+        "save_recording_nnpc": save_as("nnpc"),
+        "save_recording_nnpc_16k": save_as("nnpc", 16000),
+    }
+
+
+def bench_history(path):
+    events = nn.EventStore(path)
+    for item in make_history(2000):
+        ts = datetime.strptime(f"{item['date']} {item['time']}", "%Y-%m-%d %H:%M:%S").timestamp()
+        events.add(item, ts)
+    nn.state["events"] = events
+    nn.state["stats"] = nn.StatsAggregator(events)
+    detection = make_history(1)[0]
+    now = datetime.now()
+    return {
+        "compute_stats_2000": nn.compute_stats,
+        "stats_rebuild_2000": lambda: nn.StatsAggregator(events),
+        "stats_add": lambda: nn.state["stats"].add(now),
+        "event_store_add": lambda: events.add(detection, time.time()),
+    }
+
+
+def run(block_sizes, sample_rates, tmp, quick=False):
+    min_time = 0.05 if quick else 0.2
+    results = []
+
+    def record(name, fn, **params):
+        best, median, number = measure(fn, min_time=min_time)
+        results.append({
+            "name": name,
+            "params": params,
+            "best_us": best * 1e6,
+            "median_us": median * 1e6,
+            "loops": number,
+        })
+        label = " ".join(f"{k}={v}" for k, v in params.items())
+        print(f"  {name:<28} {label:<24} {median * 1e6:12.1f} us")
+
+    for sr in sample_rates:
+        for bs in block_sizes:
+            for name, fn in bench_block(bs, sr).items():
+                record(name, fn, block_size=bs, sample_rate=sr)
+    for sr in sample_rates:
+        for name, fn in bench_event(sr).items():
+            record(name, fn, sample_rate=sr)
+    for name, fn in bench_history(os.path.join(tmp, "events.db")).items():
+        record(name, fn)
+    return results
+
+
+def key(result):
+    return result["name"], tuple(sorted(result["params"].items()))
+
+
+def compare(results, baseline_path):
+    with open(baseline_path) as f:
+        baseline = {key(r): r for r in json.load(f)["results"]}
+    print(f"\n=== Compared to {baseline_path} (median, new/old) ===\n")
+    for r in results:
+        old = baseline.get(key(r))
+        if old is None:
+            continue
+        ratio = r["median_us"] / old["median_us"] if old["median_us"] else float("inf")
+        label = " ".join(f"{k}={v}" for k, v in r["params"].items())
+        flag = "  SLOWER" if ratio > 1.1 else ""
+        print(f"  {r['name']:<28} {label:<24} {ratio:7.2f}x{flag}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--output", default="bench_results.json", help="JSON results file")
+    parser.add_argument("--compare", help="previous results file to compare against")
+    parser.add_argument("--quick", action="store_true", help="shorter timing runs")
+    parser.add_argument("--block-sizes", default=",".join(map(str, BLOCK_SIZES)))
+    parser.add_argument("--sample-rates", default=",".join(map(str, SAMPLE_RATES)))
+    args = parser.parse_args()
+
+    # Keep recordings and event store writes out of the working tree
+    tmp = tempfile.mkdtemp(prefix="nn_bench_")
+    nn.RECORDINGS_DIR = tmp
+    nn.log.setLevel("WARNING")
+    nn.state["config"] = nn.load_config()
+
+    print("\n=== NoisyNeighbors benchmarks ===\n")
+    try:
+        results = run(
+            [int(b) for b in args.block_sizes.split(",")],
+            [int(r) for r in args.sample_rates.split(",")],
+            tmp,
+            quick=args.quick,
+        )
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    with open(args.output, "w") as f:
+        json.dump({
+            "created": datetime.now().isoformat(timespec="seconds"),
+            "python": sys.version.split()[0],
+            "numpy": np.__version__,
+            "machine": platform.machine(),
+            "platform": platform.platform(),
+            "results": results,
+        }, f, indent=2)
+        f.write("\n")
+    print(f"\nResults written to {args.output}")
+
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,21 +2,31 @@
 """NoisyNeighbors - Detects neighbor booms and plays them back."""
 
 import json
+import math
+import zlib
 import os
+import re
 import sys
 import time
 import wave
 import queue
 import logging
+import functools
 import tempfile
 import threading
+import struct
+import sqlite3
 import subprocess
+from bisect import bisect_left
+from collections import deque, namedtuple
+from contextlib import ExitStack
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import datetime, date, timedelta
 
 import numpy as np
 import sounddevice as sd
-from flask import Flask, render_template, send_from_directory, jsonify
-from flask_socketio import SocketIO
+from flask import Flask, Response, render_template, send_from_directory, jsonify, request
+from flask_socketio import SocketIO, join_room
 
 logging.basicConfig(
     level=logging.INFO,
@@ -35,21 +45,26 @@ RECORDINGS_DIR = os.path.join(BASE_DIR, "recordings")
 # Shared state
 state = {
     "status": "listening",
-    "history": [],
-    "today_count": 0,
-    "today_date": str(date.today()),
+    "version": 0,
+    "events": None,
+    "stats": None,
     "config": {},
     "enabled": True,
     "cb_state": None,
+    "pipeline": None,
     "restart_audio": False,
-    "calibrating": False,
-    "calibration_samples": [],
+    "noise_floor": None,
     "hourly_boom_count": 0,
     "current_hour": -1,
+    "sample_rate": None,
+    "detector_params": None,
+    "sources": [],
+    "boom_queue": None,
 }
 
 CONFIG_PATH = "config.json"
 HISTORY_PATH = "history.json"
+EVENTS_PATH = "events.db"
 
 
 def load_config():
@@ -63,22 +78,747 @@ def save_config(cfg):
         f.write("\n")
 
 
-def load_history():
-    if os.path.exists(HISTORY_PATH):
-        with open(HISTORY_PATH) as f:
-            return json.load(f)
-    return []
-
-
-def save_history(history):
-    with open(HISTORY_PATH, "w") as f:
-        json.dump(history[-2000:], f)
+def day_start(d):
+    """Epoch time of local midnight at the start of date ``d``."""
+    return datetime.combine(d, datetime.min.time()).timestamp()
+
+
+class EventStore:
+    """Boom history in SQLite, indexed by timestamp.
+
+    Each detection is one appended row instead of a rewrite of the whole
+    history, and range queries ("today", "last 24h", "last 7 days") only
+    read the rows they need. A legacy history.json is imported on first
+    open and renamed to history.json.migrated.
+    """
+
+    COLUMNS = "id, ts, date, time, rms, duration, source, heard_by"
+    RECORDING_COLUMNS = "name, ts, duration, sr, peak, rms, size, event_id"
+
+    def __init__(self, path):
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        with self._lock, self._db:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS events ("
+                " id INTEGER PRIMARY KEY,"
+                " ts REAL NOT NULL,"
+                " date TEXT NOT NULL,"
+                " time TEXT NOT NULL,"
+                " rms REAL,"
+                " duration REAL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS events_ts ON events (ts)")
+            # Input device that triggered the response, and every device that
+            # heard the same boom (JSON list of labels)
+            columns = {r[1] for r in self._db.execute("PRAGMA table_info(events)")}
+            for column in ("source", "heard_by"):
+                if column not in columns:
+                    self._db.execute(f"ALTER TABLE events ADD COLUMN {column} TEXT")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS recordings ("
+                " name TEXT PRIMARY KEY,"
+                " ts REAL NOT NULL,"
+                " duration REAL,"
+                " sr INTEGER,"
+                " peak REAL,"
+                " rms REAL,"
+                " size INTEGER,"
+                " event_id INTEGER)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS recordings_ts ON recordings (ts)")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS recording_peaks ("
+                " name TEXT NOT NULL,"
+                " level INTEGER NOT NULL,"
+                " bins INTEGER NOT NULL,"
+                " data BLOB NOT NULL,"
+                " PRIMARY KEY (name, level))"
+            )
+
+    def migrate_json(self, path):
+        """Import a legacy history.json, then rename it out of the way."""
+        if not os.path.exists(path):
+            return 0
+        with open(path) as f:
+            history = json.load(f)
+        rows = []
+        for item in history:
+            try:
+                dt = datetime.strptime(f"{item['date']} {item['time']}", "%Y-%m-%d %H:%M:%S")
+            except (ValueError, KeyError):
+                continue
+            rows.append((dt.timestamp(), item["date"], item["time"],
+                         item.get("rms"), item.get("duration")))
+        with self._lock, self._db:
+            self._db.executemany(
+                "INSERT INTO events (ts, date, time, rms, duration) VALUES (?, ?, ?, ?, ?)", rows)
+        os.replace(path, path + ".migrated")
+        log.info("Migrated %d events from %s", len(rows), path)
+        return len(rows)
+
+    def add(self, detection, ts):
+        """Append a detection dict (date, time, rms, duration, source); returns its id."""
+        source = detection.get("source")
+        heard_by = json.dumps([source]) if source is not None else None
+        with self._lock, self._db:
+            cur = self._db.execute(
+                "INSERT INTO events (ts, date, time, rms, duration, source, heard_by)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (ts, detection["date"], detection["time"],
+                 detection.get("rms"), detection.get("duration"), source, heard_by))
+            return cur.lastrowid
+
+    def add_source(self, event_id, source):
+        """Add ``source`` to the devices that heard an event; returns the new list."""
+        with self._lock, self._db:
+            row = self._db.execute("SELECT heard_by FROM events WHERE id = ?", (event_id,)).fetchone()
+            if row is None:
+                return None
+            heard_by = json.loads(row[0]) if row[0] else []
+            heard_by.append(source)
+            self._db.execute("UPDATE events SET heard_by = ? WHERE id = ?", (json.dumps(heard_by), event_id))
+        return heard_by
+
+    def count(self, since=None):
+        with self._lock:
+            if since is None:
+                return self._db.execute("SELECT COUNT(*) FROM events").fetchone()[0]
+            return self._db.execute("SELECT COUNT(*) FROM events WHERE ts >= ?", (since,)).fetchone()[0]
+
+    def since(self, ts, limit=None):
+        """Events at or after epoch ``ts``, newest first."""
+        sql = f"SELECT {self.COLUMNS} FROM events WHERE ts >= ? ORDER BY ts DESC"
+        args = (ts,)
+        if limit is not None:
+            sql += " LIMIT ?"
+            args += (limit,)
+        with self._lock:
+            rows = [dict(r) for r in self._db.execute(sql, args)]
+        for row in rows:
+            row["heard_by"] = json.loads(row["heard_by"]) if row["heard_by"] else []
+        return rows
+
+    def daily_counts(self, since):
+        """{date: count} for events at or after epoch ``since``."""
+        with self._lock:
+            return dict(self._db.execute(
+                "SELECT date, COUNT(*) FROM events WHERE ts >= ? GROUP BY date", (since,)).fetchall())
+
+    def hourly_counts(self, since):
+        """{(date, hour): count} for events at or after epoch ``since``."""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT date, CAST(substr(time, 1, 2) AS INTEGER) AS hour, COUNT(*)"
+                " FROM events WHERE ts >= ? GROUP BY date, hour", (since,)).fetchall()
+        return {(d, h): n for d, h, n in rows}
+
+    def week_hour_counts(self):
+        """{(weekday, hour): count} over all events, Monday = 0."""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT (CAST(strftime('%w', date) AS INTEGER) + 6) % 7 AS wd,"
+                " CAST(substr(time, 1, 2) AS INTEGER) AS hour, COUNT(*)"
+                " FROM events GROUP BY wd, hour").fetchall()
+        return {(wd, h): n for wd, h, n in rows}
+
+    def nearest(self, ts, before=10.0, after=1.0):
+        """The event closest to epoch ``ts`` within the window, or None."""
+        with self._lock:
+            row = self._db.execute(
+                f"SELECT {self.COLUMNS} FROM events WHERE ts BETWEEN ? AND ?"
+                " ORDER BY ABS(ts - ?) LIMIT 1", (ts - before, ts + after, ts)).fetchone()
+        return dict(row) if row else None
+
+    def add_recording(self, meta):
+        """Insert or replace a recordings row from a dict with RECORDING_COLUMNS keys."""
+        names = self.RECORDING_COLUMNS.split(", ")
+        with self._lock, self._db:
+            self._db.execute(
+                f"INSERT OR REPLACE INTO recordings ({self.RECORDING_COLUMNS})"
+                f" VALUES ({', '.join('?' * len(names))})",
+                [meta.get(n) for n in names])
+
+    def remove_recordings(self, names):
+        rows = [(n,) for n in names]
+        with self._lock, self._db:
+            self._db.executemany("DELETE FROM recordings WHERE name = ?", rows)
+            self._db.executemany("DELETE FROM recording_peaks WHERE name = ?", rows)
+
+    def set_peaks(self, name, levels):
+        """Store a peak pyramid: a list of (bins, 2) int8 arrays, finest first."""
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM recording_peaks WHERE name = ?", (name,))
+            self._db.executemany(
+                "INSERT INTO recording_peaks (name, level, bins, data) VALUES (?, ?, ?, ?)",
+                [(name, i, len(p), p.tobytes()) for i, p in enumerate(levels)])
+
+    def peaks(self, name, min_bins):
+        """The coarsest stored level with at least ``min_bins`` bins (or the
+        finest one), as (level, (bins, 2) int8 array); None if missing."""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT level, data FROM recording_peaks WHERE name = ? AND (bins >= ? OR level = 0)"
+                " ORDER BY level DESC LIMIT 1", (name, min_bins)).fetchone()
+        if row is None:
+            return None
+        return row[0], np.frombuffer(row[1], dtype=np.int8).reshape(-1, 2)
+
+    def names_without_peaks(self):
+        with self._lock:
+            return [r[0] for r in self._db.execute(
+                "SELECT name FROM recordings WHERE name NOT IN"
+                " (SELECT DISTINCT name FROM recording_peaks)")]
+
+    def recording_files(self):
+        """{name: (size, ts)} for every indexed recording."""
+        with self._lock:
+            return {r[0]: (r[1], r[2]) for r in self._db.execute("SELECT name, size, ts FROM recordings")}
+
+    def recordings(self, cursor=None, limit=50, since=None, until=None, min_rms=None):
+        """Recordings newest first, after ``cursor`` (the last name of the previous page)."""
+        where, args = [], []
+        for clause, value in (("name < ?", cursor), ("ts >= ?", since),
+                              ("ts < ?", until), ("rms >= ?", min_rms)):
+            if value is not None:
+                where.append(clause)
+                args.append(value)
+        sql = f"SELECT {self.RECORDING_COLUMNS} FROM recordings"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY name DESC LIMIT ?"
+        with self._lock:
+            return [dict(r) for r in self._db.execute(sql, args + [limit])]
+
+    def recording(self, name):
+        with self._lock:
+            row = self._db.execute(
+                f"SELECT {self.RECORDING_COLUMNS} FROM recordings WHERE name = ?", (name,)).fetchone()
+        return dict(row) if row else None
+
+
+class StatsAggregator:
+    """Rolling boom counts kept up to date as detections are logged.
+
+    Hourly buckets (last HOURLY_DAYS days), daily buckets (last DAILY_DAYS
+    days), an hour-of-week heatmap and the all-time total are loaded once
+    from the event store at startup, then add() updates them in O(1). Stats
+    requests never touch the store, whatever the history size.
+    """
+
+    HOURLY_DAYS = 2
+    DAILY_DAYS = 31
+
+    def __init__(self, events):
+        self._lock = threading.Lock()
+        today = date.today()
+        self.hourly = events.hourly_counts(day_start(today - timedelta(days=self.HOURLY_DAYS - 1)))
+        self.daily = events.daily_counts(day_start(today - timedelta(days=self.DAILY_DAYS - 1)))
+        self.heatmap = [[0] * 24 for _ in range(7)]
+        for (wd, h), n in events.week_hour_counts().items():
+            self.heatmap[wd][h] = n
+        self.total = events.count()
+        self._pruned = today
+
+    def add(self, dt):
+        with self._lock:
+            d = str(dt.date())
+            self.hourly[(d, dt.hour)] = self.hourly.get((d, dt.hour), 0) + 1
+            self.daily[d] = self.daily.get(d, 0) + 1
+            self.heatmap[dt.weekday()][dt.hour] += 1
+            self.total += 1
+            if dt.date() != self._pruned:
+                self._prune(dt.date())
+
+    def _prune(self, today):
+        oldest_hour = str(today - timedelta(days=self.HOURLY_DAYS - 1))
+        oldest_day = str(today - timedelta(days=self.DAILY_DAYS - 1))
+        self.hourly = {k: n for k, n in self.hourly.items() if k[0] >= oldest_hour}
+        self.daily = {k: n for k, n in self.daily.items() if k >= oldest_day}
+        self._pruned = today
+
+    def today(self):
+        return self.daily.get(str(date.today()), 0)
+
+    def snapshot(self, now):
+        with self._lock:
+            hourly_labels, hourly_counts = [], []
+            for i in range(23, -1, -1):
+                dt = now - timedelta(hours=i)
+                hourly_labels.append(f"{dt.hour:02d}:00")
+                hourly_counts.append(self.hourly.get((str(dt.date()), dt.hour), 0))
+            day_labels, day_counts = [], []
+            for i in range(self.DAILY_DAYS - 2, -1, -1):
+                d = str(now.date() - timedelta(days=i))
+                day_labels.append(d[5:])  # MM-DD
+                day_counts.append(self.daily.get(d, 0))
+            return {
+                "hourly": {"labels": hourly_labels, "data": hourly_counts},
+                "daily": {"labels": day_labels[-7:], "data": day_counts[-7:]},
+                "monthly": {"labels": day_labels, "data": day_counts},
+                "heatmap": [row[:] for row in self.heatmap],
+                "total": self.total,
+                "today": day_counts[-1],
+                "week": sum(day_counts[-7:]),
+                "month": sum(day_counts),
+            }
 
 
 def rms(block):
     return np.sqrt(np.mean(block ** 2))
 
 
+# Frames per PortAudio capture block; detection runs once per block.
+BLOCK_SIZE = 1024
+
+# Ring buffer length: covers the dashboard maxima for pre- and post-boom
+# (5s each) plus slack for the consumer to copy an event out.
+RING_SECONDS = 15
+
+# Blocks the capture callback can hand off before the detector worker must
+# catch up (64 x 1024 frames is about 1.4s at 48 kHz).
+BLOCK_QUEUE_SLOTS = 64
+
+
+class RingBuffer:
+    """Fixed-size audio ring buffer with block-wise writes.
+
+    Every frame is stored twice (at ``pos`` and ``pos + capacity``) so that the
+    most recent ``n <= capacity`` frames are always one contiguous slice and can
+    be returned as a view without copying.
+    """
+
+    def __init__(self, capacity, channels=1, dtype=np.float32):
+        self.capacity = int(capacity)
+        self.channels = channels
+        self._buf = np.zeros((2 * self.capacity, channels), dtype=dtype)
+        self.write_pos = 0
+        self.total = 0  # frames written since creation
+
+    def write(self, block):
+        """Append a (frames, channels) block, overwriting the oldest frames."""
+        n = len(block)
+        cap = self.capacity
+        pos = self.write_pos
+        if n > cap:
+            skipped = n - cap
+            block = block[-cap:]
+            pos = (pos + skipped) % cap
+            self.total += skipped
+            n = cap
+        first = min(n, cap - pos)
+        self._buf[pos:pos + first] = block[:first]
+        self._buf[pos + cap:pos + cap + first] = block[:first]
+        rest = n - first
+        if rest:
+            self._buf[:rest] = block[first:]
+            self._buf[cap:cap + rest] = block[first:]
+        self.write_pos = (pos + n) % cap
+        self.total += n
+
+    def last(self, n):
+        """Return a read-only view of the last ``n`` frames (oldest first)."""
+        n = max(0, min(int(n), self.capacity, self.total))
+        end = self.write_pos + self.capacity
+        view = self._buf[end - n:end]
+        view.flags.writeable = False
+        return view
+
+    def read(self, start, n):
+        """Return a read-only view of ``n`` frames from absolute frame ``start``.
+
+        The range is clipped to the frames still held in the buffer.
+        """
+        oldest = max(0, self.total - self.capacity)
+        end = min(int(start) + int(n), self.total)
+        start = max(int(start), oldest)
+        n = max(0, end - start)
+        idx = start % self.capacity
+        view = self._buf[idx:idx + n]
+        view.flags.writeable = False
+        return view
+
+
+class BlockQueue:
+    """Bounded single-producer/single-consumer handoff for audio blocks.
+
+    Slots are preallocated, so push() is a copy into the next free slot and
+    never locks, blocks or allocates. If the consumer falls behind, the block
+    is dropped and counted instead. ``_head`` is only written by the producer
+    and ``_tail`` only by the consumer.
+    """
+
+    def __init__(self, n_slots, block_size, channels=1):
+        self.n_slots = n_slots
+        self._slots = np.zeros((n_slots, block_size, channels), dtype=np.float32)
+        self._frames = [0] * n_slots
+        self._head = 0
+        self._tail = 0
+        self.dropped = 0
+        self.high_water = 0
+
+    def __len__(self):
+        return self._head - self._tail
+
+    def push(self, block):
+        """Copy ``block`` into the queue. Returns False if it was dropped."""
+        head = self._head
+        used = head - self._tail
+        if used >= self.n_slots:
+            self.dropped += 1
+            return False
+        i = head % self.n_slots
+        frames = min(len(block), self._slots.shape[1])
+        self._slots[i, :frames] = block[:frames]
+        self._frames[i] = frames
+        self._head = head + 1
+        if used + 1 > self.high_water:
+            self.high_water = used + 1
+        return True
+
+    def pop(self):
+        """Return a view of the oldest block, or None if empty.
+
+        The view stays valid until release() is called.
+        """
+        tail = self._tail
+        if tail == self._head:
+            return None
+        i = tail % self.n_slots
+        return self._slots[i, :self._frames[i]]
+
+    def release(self):
+        """Hand the slot returned by pop() back to the producer."""
+        self._tail += 1
+
+
+def block_levels(audio, block_size=BLOCK_SIZE):
+    """rms() of every complete ``block_size`` block of ``audio``, vectorized."""
+    n = len(audio) // block_size
+    blocks = audio[:n * block_size].reshape(n, -1)
+    return np.sqrt(np.mean(np.square(blocks, dtype=np.float32), axis=1))
+
+
+def find_triggers(levels, ends, threshold, hold_samples):
+    """Replay the live detector gating over a sequence of levels.
+
+    ``ends[i]`` is the frame position at which ``levels[i]`` was measured.
+    A level above ``threshold`` triggers; detection then stays off for
+    ``hold_samples`` after the trigger (post-roll, response and cooldown),
+    like the audio loop. Returns the trigger frame positions.
+    """
+    candidates = np.flatnonzero(levels > threshold)
+    triggers = []
+    k = 0
+    while k < len(candidates):
+        at = int(ends[candidates[k]])
+        triggers.append(at)
+        k += int(np.searchsorted(ends[candidates[k:]], at + hold_samples, side="right"))
+    return triggers
+
+
+# --- Detector engines ---
+# An engine turns each captured block into a level and decides whether it
+# crosses the threshold: detect(block, threshold) returns (level, offset),
+# where offset is the frame within the block at which the threshold was
+# crossed, or None. levels(audio) returns (levels, end positions) over a
+# whole file for the offline analyzer. reset() forgets the audio seen so
+# far, so detection resumed after a pause starts from silence instead of
+# the boom that caused it. "rms" is the broadband RMS (per block, or over
+# a sliding window); "lowfreq" only reacts to low-frequency energy. Select
+# with "detector" in config.json.
+
+DETECTORS = ["rms", "lowfreq"]
+
+# Rate the low-frequency engine decimates to before filtering
+LOWFREQ_RATE = 2000
+
+
+class RmsDetector:
+    """Broadband RMS of each block."""
+
+    name = "rms"
+
+    def reset(self):
+        pass
+
+    def detect(self, block, threshold):
+        level = rms(block)
+        return level, (len(block) if level > threshold else None)
+
+    def levels(self, audio, block_size=BLOCK_SIZE):
+        levels = block_levels(audio, block_size)
+        return levels, np.arange(1, len(levels) + 1) * block_size
+
+
+class SlidingRmsDetector:
+    """Broadband RMS over a sliding window, evaluated every ``hop`` frames.
+
+    Window and hop are independent of the capture block size. Each block's
+    squared samples are appended to the previous window's tail and prefix
+    summed, so every hop is one subtraction whatever the hop length, and
+    the frame at which the threshold was crossed is exact.
+    """
+
+    name = "rms"
+
+    def __init__(self, sr, window_ms=20.0, hop_ms=5.0):
+        self.window = max(1, int(sr * window_ms / 1000))
+        self.hop = max(1, int(sr * hop_ms / 1000))
+        self.reset()
+
+    def reset(self):
+        self._tail = np.zeros(self.window)
+        self._seen = 0
+        self._level = 0.0
+
+    def _hop_levels(self, block):
+        sq = np.square(block, dtype=np.float32)
+        if sq.ndim == 2:
+            sq = sq.mean(axis=1)
+        x = np.concatenate([self._tail, sq])
+        c = np.concatenate([[0.0], np.cumsum(x)])
+        n = len(sq)
+        offsets = np.arange((-self._seen) % self.hop or self.hop, n + 1, self.hop)
+        sums = c[offsets + self.window] - c[offsets]
+        self._tail = x[len(x) - self.window:]
+        self._seen += n
+        return offsets, np.sqrt(np.maximum(sums, 0.0) / self.window)
+
+    def detect(self, block, threshold):
+        offsets, levels = self._hop_levels(block)
+        if len(levels) == 0:
+            return self._level, None
+        self._level = float(levels.max())
+        hits = np.flatnonzero(levels > threshold)
+        return self._level, (int(offsets[hits[0]]) if len(hits) else None)
+
+    def levels(self, audio, chunk=1 << 20):
+        all_offsets, all_levels = [], []
+        for i in range(0, len(audio), chunk):
+            offsets, levels = self._hop_levels(audio[i:i + chunk])
+            all_offsets.append(offsets + i)
+            all_levels.append(levels)
+        if not all_levels:
+            return np.zeros(0), np.zeros(0, dtype=np.int64)
+        return np.concatenate(all_levels), np.concatenate(all_offsets)
+
+
+def lowpass_biquad(cutoff, sr, q=0.7071):
+    """RBJ cookbook low-pass biquad, as normalized (b0, b1, b2, a1, a2)."""
+    w0 = 2 * math.pi * cutoff / sr
+    alpha = math.sin(w0) / (2 * q)
+    cos_w0 = math.cos(w0)
+    a0 = 1 + alpha
+    b0 = (1 - cos_w0) / 2 / a0
+    return (b0, 2 * b0, b0, -2 * cos_w0 / a0, (1 - alpha) / a0)
+
+
+def run_biquads(x, sections, state):
+    """Reference per-sample cascade of transposed direct form II biquads.
+
+    ``state`` is a flat list of two values per section, updated in place.
+    Only used to derive the block matrices of BlockIIR.
+    """
+    y = []
+    for v in x:
+        for i, (b0, b1, b2, a1, a2) in enumerate(sections):
+            s1, s2 = state[2 * i], state[2 * i + 1]
+            out = b0 * v + s1
+            state[2 * i] = b1 * v - a1 * out + s2
+            state[2 * i + 1] = b2 * v - a2 * out
+            v = out
+        y.append(v)
+    return y
+
+
+class BlockIIR:
+    """Biquad cascade applied a whole block at a time.
+
+    For a block of length n the filter is linear in (input, state), so
+    ``y = Ty @ x + Sy @ z`` and ``z' = Tz @ x + Sz @ z``. The four matrices
+    are derived once per block length from run_biquads() and cached, which
+    turns the per-sample recursion into two small matrix products per block.
+    """
+
+    def __init__(self, sections):
+        self.sections = sections
+        self.state = np.zeros(2 * len(sections))
+        self._matrices = {}
+
+    def _build(self, n):
+        m = len(self.state)
+        ty, tz = np.zeros((n, n)), np.zeros((m, n))
+        sy, sz = np.zeros((n, m)), np.zeros((m, m))
+        for j in range(n):
+            x = np.zeros(n)
+            x[j] = 1.0
+            z = [0.0] * m
+            ty[:, j] = run_biquads(x, self.sections, z)
+            tz[:, j] = z
+        for k in range(m):
+            z = [0.0] * m
+            z[k] = 1.0
+            sy[:, k] = run_biquads(np.zeros(n), self.sections, z)
+            sz[:, k] = z
+        return ty, sy, tz, sz
+
+    def process(self, x):
+        n = len(x)
+        mats = self._matrices.get(n)
+        if mats is None:
+            mats = self._matrices[n] = self._build(n)
+        ty, sy, tz, sz = mats
+        y = ty @ x + sy @ self.state
+        self.state = tz @ x + sz @ self.state
+        return y
+
+
+class LowFreqDetector:
+    """Low-frequency "boom" energy from a streaming filterbank.
+
+    Each block is mixed to mono, decimated to about LOWFREQ_RATE by block
+    averaging and low-passed at ``cutoff`` Hz by two Butterworth biquads.
+    The level is the RMS of that band, or 0 when the band holds less than
+    ``min_ratio`` of the block's total energy (voices, TV, test tones).
+    """
+
+    name = "lowfreq"
+
+    def __init__(self, sr, cutoff=150.0, min_ratio=0.5):
+        self.factor = max(1, sr // LOWFREQ_RATE)
+        rate = sr / self.factor
+        section = lowpass_biquad(min(cutoff, rate * 0.45), rate)
+        self.iir = BlockIIR([section, section])
+        self.min_ratio = min_ratio
+        self._carry = np.zeros(0, dtype=np.float32)
+
+    def reset(self):
+        self.iir.state[:] = 0.0
+        self._carry = np.zeros(0, dtype=np.float32)
+
+    def detect(self, block, threshold):
+        level = self.process(block)
+        return level, (len(block) if level > threshold else None)
+
+    def process(self, block):
+        mono = block.mean(axis=1) if block.ndim == 2 else block
+        total = float(np.mean(np.square(mono, dtype=np.float32)))
+        x = np.concatenate([self._carry, mono])
+        n = len(x) // self.factor
+        self._carry = x[n * self.factor:]
+        if n == 0:
+            return 0.0
+        low = self.iir.process(x[:n * self.factor].reshape(n, self.factor).mean(axis=1))
+        energy = float(np.mean(low * low))
+        if total <= 0 or energy < self.min_ratio * total:
+            return 0.0
+        return math.sqrt(energy)
+
+    def levels(self, audio, block_size=BLOCK_SIZE):
+        n = len(audio) // block_size
+        levels = np.array([self.process(audio[i * block_size:(i + 1) * block_size]) for i in range(n)])
+        return levels, np.arange(1, n + 1) * block_size
+
+
+def make_detector(cfg, sr):
+    """Build the detector engine selected by ``cfg["detector"]``."""
+    engine = cfg.get("detector", "rms")
+    if engine not in DETECTORS:
+        log.warning("Unknown detector '%s', using rms", engine)
+        engine = "rms"
+    if engine == "lowfreq":
+        try:
+            cutoff = float(cfg.get("lowfreq_cutoff_hz") or 150)
+            min_ratio = float(cfg.get("lowfreq_min_ratio") or 0.5)
+        except (TypeError, ValueError):
+            cutoff, min_ratio = 150.0, 0.5
+        return LowFreqDetector(sr, cutoff, min_ratio)
+    try:
+        window_ms = float(cfg.get("detection_window_ms") or 0)
+        hop_ms = float(cfg.get("detection_hop_ms") or 5)
+    except (TypeError, ValueError):
+        window_ms, hop_ms = 0, 5
+    if window_ms > 0:
+        return SlidingRmsDetector(sr, window_ms, hop_ms)
+    return RmsDetector()
+
+
+# Detector blocks between noise floor refreshes (about 2s at 48 kHz)
+NOISE_FLOOR_EVERY = 100
+
+
+class NoiseFloorTracker:
+    """Constant-memory streaming estimate of the ambient level.
+
+    Keeps an exponentially weighted mean/variance and an exponentially
+    decaying histogram of log levels (time constant ``tau`` seconds), from
+    which percentiles are read. The detector only feeds levels that did not
+    trigger, so booms do not raise the floor.
+    """
+
+    BINS_PER_DECADE = 20
+    MIN_DECADE = -5  # 1e-5
+
+    def __init__(self, tau=300.0):
+        self.tau = tau
+        self.counts = np.zeros(-self.MIN_DECADE * self.BINS_PER_DECADE)
+        self.weight = 0.0
+        self.mean = 0.0
+        self.var = 0.0
+        self.samples = 0
+        self.threshold = None  # adaptive threshold, set by refresh()
+
+    @property
+    def std(self):
+        return math.sqrt(self.var)
+
+    def update(self, level, dt):
+        decay = math.exp(-dt / self.tau)
+        self.counts *= decay
+        if level > 0:
+            i = int((math.log10(level) - self.MIN_DECADE) * self.BINS_PER_DECADE)
+            self.counts[min(max(i, 0), len(self.counts) - 1)] += 1.0
+        else:
+            self.counts[0] += 1.0
+        self.weight = self.weight * decay + 1.0
+        w = 1.0 / self.weight
+        delta = level - self.mean
+        self.mean += w * delta
+        self.var = (1.0 - w) * (self.var + w * delta * delta)
+        self.samples += 1
+
+    def percentile(self, q):
+        total = self.counts.sum()
+        if total <= 0:
+            return 0.0
+        i = int(np.searchsorted(np.cumsum(self.counts), total * q / 100.0))
+        i = min(i, len(self.counts) - 1)
+        # Geometric centre of the bin
+        return 10 ** (self.MIN_DECADE + (i + 0.5) / self.BINS_PER_DECADE)
+
+    def refresh(self, params):
+        """Recompute the adaptive threshold from the current percentiles."""
+        if self.samples < 10:
+            self.threshold = None
+            return
+        floor = self.percentile(params.adaptive_percentile)
+        self.threshold = float(np.clip(floor * params.adaptive_factor, 0.01, 1.0))
+
+    def snapshot(self):
+        return {
+            "p50": self.percentile(50),
+            "p90": self.percentile(90),
+            "p99": self.percentile(99),
+            "mean": self.mean,
+            "std": self.std,
+            "adaptive_threshold": self.threshold,
+        }
+
+
 def is_in_time_range(start_str, end_str):
     """Check if current time is within [start, end]. Handles midnight crossing."""
     try:
@@ -93,10 +833,112 @@ def is_in_time_range(start_str, end_str):
         return False
 
 
+def next_boundary(start_str, end_str):
+    """Epoch time of the next start or end of a daily [start, end] window."""
+    now = datetime.now()
+    candidates = []
+    for s in (start_str, end_str):
+        try:
+            t = datetime.strptime(s, "%H:%M").time()
+        except (ValueError, TypeError):
+            continue
+        at = datetime.combine(now.date(), t)
+        if at <= now:
+            at += timedelta(days=1)
+        candidates.append(at.timestamp())
+    return min(candidates, default=float("inf"))
+
+
+# Immutable snapshot of everything the audio callback needs. Built off the
+# real-time path and swapped into state["detector_params"] in one assignment.
+DetectorParams = namedtuple("DetectorParams", [
+    "threshold",     # effective RMS threshold (night threshold when active)
+    "pre_samples",
+    "post_samples",
+    "cooldown",      # seconds
+    "replay_mode",   # effective replay mode (night replay mode when active)
+    "night_active",
+    "valid_until",   # epoch time of the next night-mode boundary
+    "adaptive",      # threshold follows the noise floor
+    "adaptive_factor",
+    "adaptive_percentile",
+])
+
+
+def build_detector_params(cfg, sr):
+    """Precompute detector parameters from ``cfg`` for sample rate ``sr``."""
+    try:
+        t = float(cfg.get("threshold") or 0.15)
+        pre = int(sr * float(cfg.get("pre_boom_seconds") or 1.0))
+        post = int(sr * float(cfg.get("post_boom_seconds") or 1.5))
+        cd = float(cfg.get("cooldown_seconds") or 5)
+    except (TypeError, ValueError):
+        t, pre, post, cd = 0.15, int(sr * 1.0), int(sr * 1.5), 5
+    replay_mode = cfg.get("replay_mode", "echo")
+    night_active = False
+    valid_until = float("inf")
+    if cfg.get("night_mode_enabled", False):
+        start = cfg.get("night_mode_start", "22:00")
+        end = cfg.get("night_mode_end", "08:00")
+        night_active = is_in_time_range(start, end)
+        valid_until = next_boundary(start, end)
+        if night_active:
+            try:
+                nt = cfg.get("night_threshold")
+                if nt:
+                    t = float(nt)
+            except (TypeError, ValueError):
+                pass
+            replay_mode = cfg.get("night_replay_mode", replay_mode)
+    adaptive = cfg.get("threshold_mode", "fixed") == "adaptive"
+    try:
+        factor = float(cfg.get("adaptive_factor") or 4.0)
+        percentile = float(cfg.get("adaptive_percentile") or 95)
+    except (TypeError, ValueError):
+        factor, percentile = 4.0, 95.0
+    return DetectorParams(t, pre, post, cd, replay_mode, night_active, valid_until,
+                          adaptive, factor, percentile)
+
+
+def refresh_detector_params():
+    """Rebuild the detector parameters from the current config."""
+    sr = state["sample_rate"]
+    if sr:
+        state["detector_params"] = build_detector_params(state["config"], sr)
+
+
+SOUNDS_CHECK_SECONDS = 5
+
+
 def scheduler_loop():
-    """Background thread: check schedule every 30s and auto-enable/disable."""
+    """Background thread: check schedule every 30s and auto-enable/disable.
+
+    Also rebuilds the detector parameters when a night-mode boundary passes,
+    reloads the sound bank when files in SOUNDS_DIR change and rescans the
+    hardware inventory after a hotplug.
+    """
+    last_check = last_sounds_check = last_inventory_check = time.monotonic()
     while True:
-        time.sleep(30)
+        time.sleep(1)
+        params = state["detector_params"]
+        if params is not None and time.time() >= params.valid_until:
+            refresh_detector_params()
+            log.info("Night mode %s", "active" if state["detector_params"].night_active else "inactive")
+        if time.monotonic() - last_sounds_check >= SOUNDS_CHECK_SECONDS:
+            last_sounds_check = time.monotonic()
+            if sound_bank.scan(state["config"].get("output_sample_rate", 48000)):
+                publish("replay_mode", replay_mode_state())
+        if time.monotonic() - last_inventory_check >= INVENTORY_CHECK_SECONDS:
+            last_inventory_check = time.monotonic()
+            if inventory.check():
+                log.info("Hardware changed, inventory refreshed")
+                for event, payload in hardware_state().items():
+                    publish(event, payload)
+            if controller.attach(inventory.get()["ps4_path"]):
+                preload_rumble()
+        if time.monotonic() - last_check < 30:
+            continue
+        last_check = time.monotonic()
         cfg = state["config"]
         if not cfg.get("schedule_enabled", False):
             continue
@@ -108,9 +950,8 @@ def scheduler_loop():
             cb = state.get("cb_state")
             if cb is not None:
                 cb["paused"] = not should_be_enabled
-            status = "listening" if should_be_enabled else "disabled"
-            socketio.emit("enabled_state", {"enabled": should_be_enabled})
-            socketio.emit("status", {"state": status})
+            publish("enabled_state", {"enabled": should_be_enabled})
+            set_status("listening" if should_be_enabled else "disabled")
             log.info("Scheduler: NoisyNeighbors %s", "enabled" if should_be_enabled else "disabled")
 
 
@@ -153,7 +994,6 @@ def detect_device():
 
 
 def list_alsa_playback():
-    import re
     try:
         result = subprocess.run(["aplay", "-l"], capture_output=True, text=True)
         devices = []
@@ -169,7 +1009,7 @@ def list_alsa_playback():
 
 
 def detect_alsa_device():
-    devices = list_alsa_playback()
+    devices = inventory.get()["alsa_devices"]
     for d in devices:
         if "usb" in d["name"].lower():
             return d["id"]
@@ -178,61 +1018,793 @@ def detect_alsa_device():
     return "plughw:0,0"
 
 
-def play_audio(audio, sr, alsa_device, out_sr):
-    if sr != out_sr:
-        n_samples = int(len(audio) * out_sr / sr)
-        indices = np.linspace(0, len(audio) - 1, n_samples)
-        audio = np.interp(indices, np.arange(len(audio)), audio).astype(np.float32)
+def resolve_output_device(alsa_device):
+    """Map an ALSA id like "plughw:1,0" to a sounddevice output device index.
+
+    Returns None if the id has another form ("default", "hw:CARD=...") or no
+    device matches; the caller then plays through aplay on the id itself
+    rather than on PortAudio's default output.
+    """
+    m = re.match(r"(?:plug)?hw:(\d+),(\d+)", alsa_device or "")
+    if m is None:
+        return None
+    needle = f"(hw:{m.group(1)},{m.group(2)})"
+    for i, d in enumerate(sd.query_devices()):
+        if d["max_output_channels"] > 0 and needle in d["name"]:
+            return i
+    return None
+
+
+# Seconds before retrying an output stream that failed to open (e.g. a USB
+# DAC that was not ready at boot); playback uses aplay meanwhile
+OUTPUT_RETRY_SECONDS = 30
 
-    peak = np.max(np.abs(audio))
-    if peak > 0:
-        audio = audio / peak
 
-    audio_int16 = (audio * 32767).astype(np.int16)
-    stereo = np.column_stack([audio_int16, audio_int16])
+class AudioPlayer:
+    """Persistent output stream fed from memory.
 
+    The stream is opened on first use and kept open; it is only reopened when
+    the ALSA device or output rate changes. play() hands (frames, 2) float32
+    chunks to the stream callback through a bounded queue and returns once
+    they have been consumed.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._chunks = queue.Queue(maxsize=8)
+        self._stream = None
+        self._key = None
+        self._failed = {}  # key -> monotonic time of the last failed open
+        self._current = None
+        self._pos = 0
+
+    def _callback(self, outdata, frames, time_info, status):
+        filled = 0
+        while filled < frames:
+            if self._current is None:
+                try:
+                    item = self._chunks.get_nowait()
+                except queue.Empty:
+                    break
+                if isinstance(item, threading.Event):
+                    item.set()
+                    continue
+                self._current, self._pos = item, 0
+            n = min(frames - filled, len(self._current) - self._pos)
+            outdata[filled:filled + n] = self._current[self._pos:self._pos + n, :outdata.shape[1]]
+            filled += n
+            self._pos += n
+            if self._pos >= len(self._current):
+                self._current = None
+        outdata[filled:] = 0
+
+    def _open(self, alsa_device, out_sr):
+        key = (alsa_device, out_sr)
+        if self._stream is not None and self._key == key:
+            return True
+        failed = self._failed.get(key)
+        if failed is not None and time.monotonic() - failed < OUTPUT_RETRY_SECONDS:
+            return False
+        self.close()
+        try:
+            device = resolve_output_device(alsa_device)
+            if device is None:
+                raise ValueError("no matching PortAudio output device")
+            stream = sd.OutputStream(
+                samplerate=out_sr,
+                channels=2,
+                dtype="float32",
+                device=device,
+                callback=self._callback,
+            )
+            stream.start()
+        except Exception as e:
+            log.error("Cannot open output stream on %s (%d Hz), using aplay for %ds: %s",
+                      alsa_device, out_sr, OUTPUT_RETRY_SECONDS, e)
+            self._failed[key] = time.monotonic()
+            return False
+        self._failed.pop(key, None)
+        self._stream, self._key = stream, key
+        log.info("Output stream open on %s (%d Hz)", alsa_device, out_sr)
+        return True
+
+    def close(self):
+        if self._stream is not None:
+            try:
+                self._stream.close()
+            except Exception:
+                pass
+        self._stream = self._key = None
+
+    def play(self, chunks, alsa_device, out_sr):
+        """Play a stereo buffer or an iterable of stereo chunks.
+
+        Blocks until playback has been handed to the device. Returns False if
+        the output stream could not be opened.
+        """
+        if isinstance(chunks, np.ndarray):
+            chunks = [chunks]
+        with self._lock:
+            if not self._open(alsa_device, out_sr):
+                return False
+            done = threading.Event()
+            try:
+                for chunk in chunks:
+                    self._chunks.put(np.ascontiguousarray(chunk, dtype=np.float32), timeout=2)
+                self._chunks.put(done, timeout=2)
+                while not done.wait(0.5):
+                    if not self._stream.active:
+                        raise queue.Full
+            except queue.Full:
+                log.error("Output stream stalled, reopening on next playback")
+                self._reset()
+        return True
+
+    def _reset(self):
+        self.close()
+        while True:
+            try:
+                self._chunks.get_nowait()
+            except queue.Empty:
+                break
+        self._current = None
+
+
+player = AudioPlayer()
+
+
+# Polyphase resampler settings: length of the windowed-sinc low-pass in
+# periods of the lower of the two rates (so decimation gets a proportionally
+# longer filter) and the passband edge as a fraction of the lower Nyquist
+# frequency.
+RESAMPLE_TAPS = 16
+RESAMPLE_ROLLOFF = 0.9
+RESAMPLE_MAX_PHASES = 1024
+RESAMPLE_CHUNK = 4096
+
+
+@functools.lru_cache(maxsize=16)
+def resample_filter(in_sr, out_sr):
+    """Return ``(up, down, bank)`` for resampling ``in_sr`` -> ``out_sr``.
+
+    ``bank`` is the (up, taps) float32 polyphase decomposition of a Kaiser
+    windowed-sinc low-pass, with taps reversed so that each row can be
+    applied directly to a window of input samples.
+    """
+    g = math.gcd(in_sr, out_sr)
+    up, down = out_sr // g, in_sr // g
+    if up > RESAMPLE_MAX_PHASES:
+        raise ValueError(f"Unsupported resampling ratio {in_sr} -> {out_sr}")
+    taps = RESAMPLE_TAPS * -(-max(up, down) // up)
+    n = taps * up
+    fc = RESAMPLE_ROLLOFF * 0.5 / max(up, down)
+    t = np.arange(n) - (n - 1) / 2
+    h = 2 * fc * np.sinc(2 * fc * t) * np.kaiser(n, 8.0)
+    h *= up / h.sum()
+    bank = h.reshape(taps, up).T[:, ::-1]
+    return up, down, np.ascontiguousarray(bank, dtype=np.float32)
+
+
+class StreamingResampler:
+    """Band-limited polyphase resampler that works chunk by chunk.
+
+    Filters are shared through resample_filter(). Between chunks only the
+    last ``taps - 1`` input frames and the index of the next output frame are
+    kept, so a clip can be resampled while it is being played.
+    """
+
+    def __init__(self, in_sr, out_sr, channels=1):
+        self.up, self.down, self._bank = resample_filter(in_sr, out_sr)
+        self.taps = self._bank.shape[1]
+        self.channels = channels
+        self._hist = np.zeros((self.taps - 1, channels), dtype=np.float32)
+        self._in_pos = 0  # absolute index of the next input frame
+        # Start at the filter's group delay so output frame 0 lines up with
+        # input frame 0.
+        self._m0 = int(round((self.taps * self.up - 1) / 2 / self.down))
+        self._m = self._m0
+
+    def _run(self, chunk, limit=None):
+        mono = chunk.ndim == 1
+        chunk = chunk.reshape(len(chunk), -1).astype(np.float32, copy=False)
+        x = np.concatenate([self._hist, chunk])
+        end = self._in_pos + len(chunk)
+        m_end = -(-end * self.up // self.down)
+        if limit is not None:
+            m_end = min(m_end, limit)
+        t = np.arange(self._m, m_end, dtype=np.int64) * self.down
+        windows = np.lib.stride_tricks.sliding_window_view(x, self.taps, axis=0)
+        out = np.einsum("mct,mt->mc", windows[t // self.up - self._in_pos], self._bank[t % self.up])
+        self._hist = x[len(x) - self.taps + 1:].copy()
+        self._in_pos = end
+        self._m = max(self._m, m_end)
+        return out[:, 0] if mono else out
+
+    def process(self, chunk):
+        """Resample one chunk of (frames,) or (frames, channels) float audio."""
+        return self._run(chunk)
+
+    def flush(self, mono=False):
+        """Return the output still held back by the filter delay."""
+        zeros = np.zeros((self.taps, self.channels), dtype=np.float32)
+        target = self._m0 + -(-self._in_pos * self.up // self.down)
+        out = self._run(zeros, target)
+        return out[:, 0] if mono else out
+
+
+def resample(audio, sr, out_sr):
+    """Resample (frames,) or (frames, channels) audio from ``sr`` to ``out_sr``."""
+    if sr == out_sr:
+        return audio
+    channels = 1 if audio.ndim == 1 else audio.shape[1]
+    rs = StreamingResampler(sr, out_sr, channels)
+    return np.concatenate([rs.process(audio), rs.flush(mono=audio.ndim == 1)])
+
+
+def iter_resampled(audio, sr, out_sr, chunk=RESAMPLE_CHUNK):
+    """Yield ``audio`` resampled to ``out_sr`` in chunks of about ``chunk`` frames."""
+    if sr == out_sr:
+        for i in range(0, len(audio), chunk):
+            yield audio[i:i + chunk]
+        return
+    channels = 1 if audio.ndim == 1 else audio.shape[1]
+    rs = StreamingResampler(sr, out_sr, channels)
+    for i in range(0, len(audio), chunk):
+        yield rs.process(audio[i:i + chunk])
+    yield rs.flush(mono=audio.ndim == 1)
+
+
+def read_wav(path):
+    """Decode a 16-bit PCM WAV file to float32 (frames, channels)."""
+    with wave.open(path, "r") as w:
+        channels = w.getnchannels()
+        sr = w.getframerate()
+        data = np.frombuffer(w.readframes(w.getnframes()), dtype=np.int16)
+    return data.reshape(-1, channels).astype(np.float32) / 32768, sr
+
+
+def to_stereo(audio):
+    """Return ``audio`` as a (frames, 2) float32 array."""
+    if audio.ndim == 1:
+        audio = audio[:, None]
+    if audio.shape[1] == 1:
+        audio = np.repeat(audio, 2, axis=1)
+    return np.ascontiguousarray(audio[:, :2], dtype=np.float32)
+
+
+def aplay_audio(stereo, alsa_device, out_sr):
+    """Fallback playback: write a temporary WAV and run aplay on it."""
+    audio_int16 = (np.clip(stereo, -1.0, 1.0) * 32767).astype(np.int16)
     with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as f:
         tmp_path = f.name
         with wave.open(f, "w") as w:
             w.setnchannels(2)
             w.setsampwidth(2)
             w.setframerate(out_sr)
-            w.writeframes(stereo.tobytes())
+            w.writeframes(audio_int16.tobytes())
 
     subprocess.run(["aplay", "-D", alsa_device, tmp_path], capture_output=True)
     os.unlink(tmp_path)
 
 
+def use_output_stream():
+    return state["config"].get("output_backend", "stream") == "stream"
+
+
+def play_audio(audio, sr, alsa_device, out_sr):
+    audio = np.asarray(audio, dtype=np.float32)
+    peak = float(np.max(np.abs(audio))) if len(audio) else 0.0
+    gain = np.float32(1.0 / peak if peak > 0 else 1.0)
+
+    def chunks():
+        # Resample as the output stream consumes it; the filter can overshoot
+        # the input peak slightly, hence the clip.
+        for chunk in iter_resampled(audio, sr, out_sr):
+            yield to_stereo(np.clip(chunk * gain, -1.0, 1.0))
+
+    if use_output_stream() and player.play(chunks(), alsa_device, out_sr):
+        return
+    aplay_audio(np.concatenate(list(chunks())), alsa_device, out_sr)
+
+
 SOUNDS_DIR = os.path.join(BASE_DIR, "sounds")
-AVAILABLE_SOUNDS = ["echo", "alarm", "doorbell", "hammer", "honk", "siren"]
 
 
-def play_sound_file(name, alsa_device):
-    path = os.path.join(SOUNDS_DIR, f"{name}.wav")
-    if not os.path.exists(path):
-        log.error("Sound not found: %s", path)
+class SoundBank:
+    """Response sounds decoded once and kept in memory.
+
+    scan() decodes every WAV in the directory to stereo float32 at the output
+    rate. Later scans only reload files whose mtime or size changed and drop
+    files that were removed.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.out_sr = None
+        self._sounds = {}  # name -> (frames, 2) float32
+        self._stamps = {}  # name -> (mtime, size)
+
+    def names(self):
+        return sorted(self._sounds)
+
+    def get(self, name):
+        return self._sounds.get(name)
+
+    def scan(self, out_sr):
+        """Sync the bank with the directory. Returns True if anything changed."""
+        stamps = {}
+        try:
+            for entry in os.scandir(self.directory):
+                if entry.name.endswith(".wav") and entry.is_file():
+                    st = entry.stat()
+                    stamps[entry.name[:-4]] = (st.st_mtime, st.st_size)
+        except OSError as e:
+            log.error("Cannot scan sounds: %s", e)
+        if out_sr == self.out_sr and stamps == self._stamps:
+            return False
+
+        sounds = dict(self._sounds) if out_sr == self.out_sr else {}
+        for name in list(sounds):
+            if name not in stamps:
+                del sounds[name]
+        for name, stamp in stamps.items():
+            if name in sounds and self._stamps.get(name) == stamp:
+                continue
+            try:
+                audio, sr = read_wav(os.path.join(self.directory, f"{name}.wav"))
+                sounds[name] = to_stereo(resample(audio, sr, out_sr))
+            except Exception as e:
+                log.error("Cannot load sound %s: %s", name, e)
+                sounds.pop(name, None)
+        # Swap in whole dicts so readers never see a half-updated bank
+        self._sounds, self._stamps, self.out_sr = sounds, stamps, out_sr
+        log.info("Sound bank: %s", ", ".join(self.names()) or "empty")
+        return True
+
+
+sound_bank = SoundBank(SOUNDS_DIR)
+
+
+def available_modes():
+    return ["echo"] + sound_bank.names()
+
+
+def play_sound_file(name, alsa_device, out_sr=None):
+    out_sr = out_sr or state["config"].get("output_sample_rate", 48000)
+    audio = sound_bank.get(name)
+    if audio is None:
+        log.error("Sound not loaded: %s", name)
         return
+    if use_output_stream():
+        if out_sr != sound_bank.out_sr:
+            audio = resample(audio, sound_bank.out_sr, out_sr)
+        if player.play(audio, alsa_device, out_sr):
+            return
+    path = os.path.join(SOUNDS_DIR, f"{name}.wav")
     subprocess.run(["aplay", "-D", alsa_device, path], capture_output=True)
 
 
+# --- Recording formats ---
+# "wav" is 16-bit PCM. "nnpc" is a lossless chunked codec: each chunk of
+# 16-bit samples goes through a fixed polynomial predictor (order 0-2,
+# whichever leaves the smallest residual), the residuals are zigzag coded
+# to uint16 and their low and high byte planes deflated separately. Chunks
+# decode independently, so files are read and served a chunk at a time.
+# Either format can be stored at a lower recording_sample_rate.
+
+RECORDING_FORMATS = ["wav", "nnpc"]
+RECORDING_EXTS = (".wav", ".nnpc")
+RECORDING_CHUNK = 1 << 16
+
+NNPC_MAGIC = b"NNPC"
+# magic, version, channels, sample rate, frames, frames per chunk
+NNPC_HEADER = struct.Struct("<4sBBxxIII")
+# predictor order, low plane bytes, high plane bytes
+NNPC_CHUNK = struct.Struct("<BII")
+NNPC_CHUNK_FRAMES = 16384
+
+
+def nnpc_encode_chunk(samples):
+    """Encode int16 samples as one NNPC chunk (header and both planes)."""
+    x = samples.astype(np.int32)
+    best = None
+    for order in range(3):
+        if order:
+            x = np.diff(x, prepend=0)
+        if x.min() < -32768 or x.max() > 32767:
+            break
+        cost = int(np.abs(x).sum())
+        if best is None or cost < best[0]:
+            best = (cost, order, x)
+    _, order, residual = best
+    planes = ((residual << 1) ^ (residual >> 31)).astype("<u2").view(np.uint8).reshape(-1, 2)
+    low = zlib.compress(planes[:, 0].tobytes(), 6)
+    high = zlib.compress(planes[:, 1].tobytes(), 6)
+    return NNPC_CHUNK.pack(order, len(low), len(high)) + low + high
+
+
+def nnpc_decode_chunk(order, low, high):
+    z = np.frombuffer(zlib.decompress(low), np.uint8).astype(np.int32)
+    z |= np.frombuffer(zlib.decompress(high), np.uint8).astype(np.int32) << 8
+    x = (z >> 1) ^ -(z & 1)
+    for _ in range(order):
+        x = np.cumsum(x)
+    return x.astype(np.int16)
+
+
+def write_nnpc(path, samples, sr):
+    with open(path, "wb") as f:
+        f.write(NNPC_HEADER.pack(NNPC_MAGIC, 1, 1, sr, len(samples), NNPC_CHUNK_FRAMES))
+        for i in range(0, len(samples), NNPC_CHUNK_FRAMES):
+            f.write(nnpc_encode_chunk(samples[i:i + NNPC_CHUNK_FRAMES]))
+
+
+class RecordingReader:
+    """Chunked reader for WAV and NNPC recordings.
+
+    ``sr`` and ``frames`` come from the header on open. Iterating yields
+    mono int16 chunks, decoded one at a time (RECORDING_CHUNK frames for
+    WAV, one codec chunk for NNPC).
+    """
+
+    def __init__(self, path):
+        self._f = open(path, "rb")
+        try:
+            if self._f.read(4) == NNPC_MAGIC:
+                self._f.seek(0)
+                header = NNPC_HEADER.unpack(self._f.read(NNPC_HEADER.size))
+                _, _, _, self.sr, self.frames, self._chunk_frames = header
+                self._wav = None
+            else:
+                self._f.seek(0)
+                self._wav = wave.open(self._f, "rb")
+                self.sr, self.frames = self._wav.getframerate(), self._wav.getnframes()
+        except Exception:
+            self._f.close()
+            raise
+
+    def __iter__(self):
+        return self.iter_frames(0, self.frames)
+
+    def iter_frames(self, start, stop):
+        """Yield frames [start, stop) in chunks; NNPC chunks before
+        ``start`` are skipped without being decoded."""
+        stop = min(stop, self.frames)
+        if self._wav is not None:
+            channels = self._wav.getnchannels()
+            self._wav.setpos(start)
+            pos = start
+            while pos < stop:
+                data = self._wav.readframes(min(RECORDING_CHUNK, stop - pos))
+                if not data:
+                    return
+                samples = np.frombuffer(data, dtype="<i2")
+                if channels > 1:
+                    samples = samples.reshape(-1, channels).mean(axis=1).astype(np.int16)
+                pos += len(samples)
+                yield samples
+            return
+        self._f.seek(NNPC_HEADER.size)
+        pos = 0
+        while pos < stop:
+            order, n_low, n_high = NNPC_CHUNK.unpack(self._f.read(NNPC_CHUNK.size))
+            n = min(self._chunk_frames, self.frames - pos)
+            if pos + n <= start:
+                self._f.seek(n_low + n_high, os.SEEK_CUR)
+            else:
+                chunk = nnpc_decode_chunk(order, self._f.read(n_low), self._f.read(n_high))
+                yield chunk[max(start - pos, 0):stop - pos]
+            pos += n
+
+    def close(self):
+        self._f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def wav_header(frames, sr):
+    """Header of a 16-bit mono PCM WAV holding ``frames`` frames."""
+    size = frames * 2
+    return struct.pack("<4sI4s4sIHHIIHH4sI", b"RIFF", 36 + size, b"WAVE", b"fmt ", 16,
+                       1, 1, sr, sr * 2, 2, 16, b"data", size)
+
+
+def wav_bytes(reader, start, stop):
+    """Yield bytes [start, stop) of ``reader`` rendered as a WAV file."""
+    header = wav_header(reader.frames, reader.sr)
+    if start < len(header):
+        yield header[start:stop]
+    first = max(start - len(header), 0) // 2
+    pos = len(header) + first * 2
+    for chunk in reader.iter_frames(first, (stop - len(header) + 1) // 2):
+        data = chunk.astype("<i2").tobytes()
+        lo, hi = max(start - pos, 0), min(stop - pos, len(data))
+        if hi > lo:
+            yield data[lo:hi]
+        pos += len(data)
+
+
+# Frames per bin of the finest waveform level; each coarser level halves
+# the bins, down to PEAK_MIN_BINS
+PEAK_BASE = 64
+PEAK_MIN_BINS = 32
+
+
+def base_peaks(samples):
+    """(bins, 2) min/max per PEAK_BASE frames of int16 ``samples``, as int8."""
+    n = -(-len(samples) // PEAK_BASE)
+    if n == 0:
+        return np.zeros((0, 2), dtype=np.int8)
+    padded = np.empty(n * PEAK_BASE, dtype=np.int16)
+    padded[:len(samples)] = samples
+    padded[len(samples):] = samples[-1]
+    blocks = padded.reshape(n, PEAK_BASE)
+    out = np.empty((n, 2), dtype=np.int8)
+    out[:, 0] = blocks.min(axis=1) >> 8
+    out[:, 1] = blocks.max(axis=1) >> 8
+    return out
+
+
+def peak_pyramid(base):
+    """Levels from ``base`` up, each combining pairs of bins of the one below."""
+    levels = [base]
+    while len(levels[-1]) > PEAK_MIN_BINS:
+        p = levels[-1]
+        if len(p) % 2:
+            p = np.concatenate([p, p[-1:]])
+        pairs = p.reshape(-1, 2, 2)
+        levels.append(np.stack([pairs[:, :, 0].min(axis=1), pairs[:, :, 1].max(axis=1)], axis=1))
+    return levels
+
+
+def compute_peaks(path):
+    """Peak pyramid of a recording, decoded chunk by chunk."""
+    with RecordingReader(path) as reader:
+        # Every chunk but the last is a multiple of PEAK_BASE frames
+        base = [base_peaks(chunk) for chunk in reader]
+    return peak_pyramid(np.concatenate(base) if base else np.zeros((0, 2), dtype=np.int8))
+
+
+def recording_meta(path):
+    """Index row for a recording found on disk without one.
+
+    The clip was peak-normalized when saved, so its captured level is taken
+    from the matching detection when there is one.
+    """
+    name = os.path.basename(path)
+    st = os.stat(path)
+    m = re.match(r"boom_(\d{8}_\d{6}_\d{6})", name)
+    ts = datetime.strptime(m.group(1), "%Y%m%d_%H%M%S_%f").timestamp() if m else st.st_mtime
+    with RecordingReader(path) as reader:
+        sr, frames = reader.sr, reader.frames
+    event = state["events"].nearest(ts)
+    return {
+        "name": name,
+        "ts": ts,
+        "duration": frames / sr if sr else 0.0,
+        "sr": sr,
+        "peak": None,
+        "rms": event["rms"] if event else None,
+        "size": st.st_size,
+        "event_id": event["id"] if event else None,
+    }
+
+
 def save_recording(audio, sr):
-    """Save boom audio as a WAV file in RECORDINGS_DIR."""
+    """Save boom audio in RECORDINGS_DIR in the configured recording_format."""
     os.makedirs(RECORDINGS_DIR, exist_ok=True)
-    filename = f"boom_{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}.wav"
+    cfg = state["config"]
+    fmt = cfg.get("recording_format", "wav")
+    rate = cfg.get("recording_sample_rate")
+    if rate and rate < sr:
+        audio, sr = resample(audio, sr, int(rate)), int(rate)
+    stamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+    filename = f"boom_{stamp}.nnpc" if fmt == "nnpc" else f"boom_{stamp}.wav"
     path = os.path.join(RECORDINGS_DIR, filename)
     peak = np.max(np.abs(audio))
     if peak > 0:
         audio = audio / peak
-    audio_int16 = (audio * 32767).astype(np.int16)
-    with wave.open(path, "w") as wf:
-        wf.setnchannels(1)
-        wf.setsampwidth(2)
-        wf.setframerate(sr)
-        wf.writeframes(audio_int16.tobytes())
+    audio_int16 = (np.clip(audio, -1.0, 1.0) * 32767).astype(np.int16)
+    if fmt == "nnpc":
+        write_nnpc(path, audio_int16, sr)
+    else:
+        with wave.open(path, "w") as wf:
+            wf.setnchannels(1)
+            wf.setsampwidth(2)
+            wf.setframerate(sr)
+            wf.writeframes(audio_int16.tobytes())
     log.info("Saved recording: %s", filename)
     return filename
 
 
+# Recordings waiting to be written; more are dropped
+RECORDING_QUEUE_SIZE = 4
+RETENTION_CHECK_SECONDS = 3600
+
+
+class RecordingStore:
+    """Background writer, index and retention for RECORDINGS_DIR.
+
+    submit() never blocks: clips go to a small queue drained by one writer
+    thread, and are dropped (and counted) when it is full. Every saved file
+    gets a row in the recordings table of the event store (duration, rate,
+    captured peak and RMS, size, detection id); at start the table is
+    reconciled with the directory once. After each write and once an hour
+    the oldest recordings are deleted until the recordings_max_mb,
+    recordings_max_days and recordings_max_count limits hold (0 disables a
+    limit).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._queue = queue.Queue(maxsize=RECORDING_QUEUE_SIZE)
+        self._thread = None
+        self._files = {}  # name -> (size, ts)
+        self._bytes = 0
+        self.saved = 0
+        self.dropped = 0
+        self.evicted = 0
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def submit(self, audio, sr, when=None, event_id=None):
+        """Queue a clip for writing. False if it was dropped."""
+        self.start()
+        try:
+            self._queue.put_nowait((audio, sr, when or datetime.now(), event_id))
+            return True
+        except queue.Full:
+            self.dropped += 1
+            log.warning("Recording queue full, clip dropped (%d total)", self.dropped)
+            return False
+
+    def _scan(self):
+        """Reconcile the index with the files actually on disk."""
+        events = state["events"]
+        indexed = events.recording_files()
+        on_disk = set()
+        if os.path.isdir(RECORDINGS_DIR):
+            for entry in os.scandir(RECORDINGS_DIR):
+                if entry.name.endswith(RECORDING_EXTS) and entry.is_file():
+                    on_disk.add(entry.name)
+        gone = [name for name in indexed if name not in on_disk]
+        if gone:
+            events.remove_recordings(gone)
+        added = 0
+        for name in sorted(on_disk - set(indexed)):
+            try:
+                meta = recording_meta(os.path.join(RECORDINGS_DIR, name))
+            except Exception as e:
+                log.error("Cannot index recording %s: %s", name, e)
+                continue
+            events.add_recording(meta)
+            indexed[name] = (meta["size"], meta["ts"])
+            added += 1
+        files = {name: indexed[name] for name in on_disk if name in indexed}
+        if gone or added:
+            log.info("Recordings index: %d added, %d removed", added, len(gone))
+        missing = [name for name in events.names_without_peaks() if name in files]
+        for name in missing:
+            try:
+                events.set_peaks(name, compute_peaks(os.path.join(RECORDINGS_DIR, name)))
+            except Exception as e:
+                log.error("Cannot compute peaks for %s: %s", name, e)
+        if missing:
+            log.info("Computed waveform peaks for %d recordings", len(missing))
+        with self._lock:
+            self._files = files
+            self._bytes = sum(size for size, _ in files.values())
+
+    def _save(self, audio, sr, when, event_id):
+        name = save_recording(audio, sr)
+        path = os.path.join(RECORDINGS_DIR, name)
+        with RecordingReader(path) as reader:
+            stored_sr = reader.sr
+        size = os.path.getsize(path)
+        state["events"].add_recording({
+            "name": name,
+            "ts": when.timestamp(),
+            "duration": len(audio) / sr,
+            "sr": stored_sr,
+            "peak": float(np.max(np.abs(audio))) if len(audio) else 0.0,
+            "rms": float(rms(audio)),
+            "size": size,
+            "event_id": event_id,
+        })
+        state["events"].set_peaks(name, compute_peaks(path))
+        with self._lock:
+            self._files[name] = (size, when.timestamp())
+            self._bytes += size
+
+    def _forget(self, name):
+        with self._lock:
+            entry = self._files.pop(name, None)
+            if entry:
+                self._bytes -= entry[0]
+        state["events"].remove_recordings([name])
+        return entry is not None
+
+    def delete(self, name):
+        """Delete a recording and its index entry. True if a file was removed;
+        a file that is already gone is only dropped from the index."""
+        try:
+            os.unlink(os.path.join(RECORDINGS_DIR, name))
+            removed = True
+        except FileNotFoundError:
+            removed = False
+        self._forget(name)
+        publish("recording_deleted", {"name": name})
+        return removed
+
+    def totals(self):
+        return len(self._files), self._bytes
+
+    def enforce(self):
+        """Delete the oldest recordings until the retention limits hold."""
+        cfg = state["config"]
+        max_bytes = cfg.get("recordings_max_mb", 500) * 1024 * 1024
+        max_days = cfg.get("recordings_max_days", 0)
+        max_count = cfg.get("recordings_max_count", 0)
+        cutoff = time.time() - max_days * 86400
+        with self._lock:
+            oldest = sorted(self._files.items(), key=lambda kv: kv[1][1])
+        count, total = len(oldest), self._bytes
+        for name, (size, ts) in oldest:
+            if not ((max_bytes and total > max_bytes)
+                    or (max_count and count > max_count)
+                    or (max_days and ts < cutoff)):
+                break
+            try:
+                removed = self.delete(name)
+            except OSError as e:
+                log.error("Cannot delete recording %s: %s", name, e)
+                self._forget(name)
+                removed = False
+            total -= size
+            count -= 1
+            if removed:
+                self.evicted += 1
+                log.info("Retention: deleted %s", name)
+
+    def stats(self):
+        return {
+            "files": len(self._files),
+            "bytes": self._bytes,
+            "queued": self._queue.qsize(),
+            "saved": self.saved,
+            "dropped": self.dropped,
+            "evicted": self.evicted,
+        }
+
+    def _run(self):
+        self._scan()
+        self.enforce()
+        while True:
+            try:
+                audio, sr, when, event_id = self._queue.get(timeout=RETENTION_CHECK_SECONDS)
+            except queue.Empty:
+                self.enforce()
+                continue
+            try:
+                self._save(audio, sr, when, event_id)
+                self.saved += 1
+                self.enforce()
+            except Exception as e:
+                log.error("Failed to save recording: %s", e)
+
+
+recordings = RecordingStore()
+
+
 def find_ps4_controller():
     try:
         import evdev
@@ -249,42 +1821,130 @@ def find_ps4_controller():
     return None
 
 
-def vibrate_ps4(duration=2.0, intensity=100):
-    import evdev
-    from evdev import ecodes, ff
+# Rumble effects kept uploaded on the controller (the DS4 driver has 16 slots)
+RUMBLE_EFFECT_SLOTS = 8
 
-    dev = find_ps4_controller()
-    if dev is None:
-        log.error("No PS4 controller found")
-        return
 
-    try:
-        mag = int(0xFFFF * max(0, min(100, intensity)) / 100)
-        rumble = ff.Rumble(strong_magnitude=mag, weak_magnitude=mag)
+class Controller:
+    """Long-lived PS4 controller session.
+
+    The evdev device stays open between rumbles and effects stay uploaded,
+    keyed by (magnitude, duration in ms), so starting a rumble is a single
+    write. The effect's replay length stops it; nothing sleeps. attach()
+    follows the hardware inventory, so a reconnected controller is picked
+    up again after hotplug.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._dev = None
+        self._path = None
+        self._effects = {}  # (magnitude, ms) -> effect id, oldest first
+
+    def attach(self, path):
+        """Open the controller at ``path`` unless it is already open.
+
+        Returns True if a device was (re)opened.
+        """
+        with self._lock:
+            if path == self._path and (self._dev is not None or path is None):
+                return False
+            self._close()
+            self._path = path
+            if path is None:
+                return False
+            try:
+                import evdev
+                self._dev = evdev.InputDevice(path)
+                log.info("PS4 controller attached: %s", path)
+                return True
+            except Exception as e:
+                log.error("Cannot open PS4 controller %s: %s", path, e)
+                return False
+
+    def _close(self):
+        if self._dev is not None:
+            try:
+                self._dev.close()
+            except Exception:
+                pass
+        self._dev = None
+        self._effects.clear()
+
+    def _effect(self, magnitude, ms):
+        key = (magnitude, ms)
+        effect_id = self._effects.get(key)
+        if effect_id is not None:
+            return effect_id
+        from evdev import ecodes, ff
+        if len(self._effects) >= RUMBLE_EFFECT_SLOTS:
+            oldest = next(iter(self._effects))
+            self._dev.erase_effect(self._effects.pop(oldest))
+        rumble = ff.Rumble(strong_magnitude=magnitude, weak_magnitude=magnitude)
         effect = ff.Effect(
             ecodes.FF_RUMBLE,
             -1, 0,
             ff.Trigger(0, 0),
-            ff.Replay(int(duration * 1000), 0),
+            ff.Replay(ms, 0),
             ff.EffectType(ff_rumble_effect=rumble),
         )
-        effect_id = dev.upload_effect(effect)
-        dev.write(ecodes.EV_FF, effect_id, 1)
-        time.sleep(duration)
-        dev.write(ecodes.EV_FF, effect_id, 0)
-        dev.erase_effect(effect_id)
-        dev.close()
-        log.info("PS4 vibration completed (%.1fs)", duration)
-    except Exception as e:
-        log.error("PS4 vibration failed: %s", e)
-        try:
-            dev.close()
-        except Exception:
-            pass
+        effect_id = self._effects[key] = self._dev.upload_effect(effect)
+        return effect_id
+
+    @staticmethod
+    def _key(duration, intensity):
+        return int(0xFFFF * max(0, min(100, intensity)) / 100), round(duration * 1000)
+
+    def preload(self, durations, intensity):
+        """Upload the effects for the given durations ahead of time."""
+        with self._lock:
+            if self._dev is None:
+                return
+            try:
+                for duration in durations:
+                    self._effect(*self._key(duration, intensity))
+            except Exception as e:
+                log.error("PS4 effect upload failed: %s", e)
+
+    def rumble(self, duration, intensity):
+        """Start a rumble and return immediately. False if no controller."""
+        from evdev import ecodes
+        with self._lock:
+            if self._dev is None:
+                return False
+            try:
+                effect_id = self._effect(*self._key(duration, intensity))
+                self._dev.write(ecodes.EV_FF, effect_id, 1)
+                return True
+            except Exception as e:
+                # Usually unplugged; the scheduler reattaches it
+                log.error("PS4 vibration failed: %s", e)
+                self._close()
+                return False
+
+
+controller = Controller()
+
+
+def preload_rumble():
+    """Upload rumble effects for a boom replay and the dashboard test."""
+    cfg = state["config"]
+    params, sr = state["detector_params"], state["sample_rate"]
+    if params is not None and sr:
+        # The same length as the captured boom (len(audio) / sr)
+        boom = (params.pre_samples + params.post_samples) / sr
+    else:
+        boom = cfg.get("pre_boom_seconds", 1.0) + cfg.get("post_boom_seconds", 1.5)
+    controller.preload([boom, 1.0], cfg.get("vibration_intensity", 100))
+
+
+def vibrate_ps4(duration=2.0, intensity=100):
+    if not controller.rumble(duration, intensity):
+        log.error("No PS4 controller found")
 
 
 def get_alsa_card():
-    alsa = state["config"].get("alsa_device", "plughw:1,0")
+    alsa = state["config"].get("alsa_device") or "plughw:1,0"
     try:
         return alsa.split(":")[1].split(",")[0]
     except (IndexError, ValueError):
@@ -321,49 +1981,442 @@ def set_volume(level):
     )
 
 
-def compute_stats():
-    """Compute boom statistics from history."""
-    history = state["history"]
-    now = datetime.now()
+# --- Hardware inventory ---
+
+INVENTORY_WATCH = ["/dev/input", "/dev/snd"]
+INVENTORY_CARDS = "/proc/asound/cards"
+INVENTORY_CHECK_SECONDS = 5
+INVENTORY_TTL = 600
+
 
-    # Booms per hour for last 24h (indexed 0-23)
-    hourly_counts = [0] * 24
-    hourly_labels = []
-    for i in range(23, -1, -1):
-        dt = now - timedelta(hours=i)
-        hourly_labels.append(f"{dt.hour:02d}:00")
+class HardwareInventory:
+    """Cached view of the controller and audio hardware.
 
-    for item in history:
+    A scan opens every evdev node, forks aplay and amixer and queries
+    PortAudio, so it runs once at startup and then only when the hardware
+    changes: check() compares the mtimes of /dev/input and /dev/snd and the
+    contents of /proc/asound/cards, and rescans anyway after INVENTORY_TTL
+    seconds. Readers get the last snapshot and never scan.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._signature = None
+        self._scanned = 0.0
+        self.snapshot = None
+
+    @staticmethod
+    def signature():
+        sig = []
+        for path in INVENTORY_WATCH:
+            try:
+                sig.append(os.stat(path).st_mtime_ns)
+            except OSError:
+                sig.append(None)
         try:
-            dt = datetime.strptime(f"{item['date']} {item['time']}", "%Y-%m-%d %H:%M:%S")
-            diff = (now - dt).total_seconds()
-            if 0 <= diff < 86400:
-                idx = 23 - int(diff // 3600)
-                if 0 <= idx < 24:
-                    hourly_counts[idx] += 1
-        except (ValueError, KeyError):
-            pass
-
-    # Booms per day for last 7 days
-    daily_counts = []
-    daily_labels = []
-    for i in range(6, -1, -1):
-        d = (now - timedelta(days=i)).strftime("%Y-%m-%d")
-        daily_labels.append(d[5:])  # MM-DD
-        count = sum(1 for h in history if h.get("date") == d)
-        daily_counts.append(count)
-
-    week_total = sum(daily_counts)
+            with open(INVENTORY_CARDS) as f:
+                sig.append(f.read())
+        except OSError:
+            sig.append(None)
+        return tuple(sig)
+
+    def get(self):
+        if self.snapshot is None:
+            self.refresh()
+        return self.snapshot
+
+    def check(self):
+        """Rescan if the hardware changed or the TTL expired.
+
+        Returns True if the snapshot changed.
+        """
+        sig = self.signature()
+        if sig == self._signature and time.monotonic() - self._scanned < INVENTORY_TTL:
+            return False
+        old = self.snapshot
+        self.refresh(sig)
+        return self.snapshot != old
+
+    def refresh(self, sig=None):
+        with self._lock:
+            # Signature first, so a change during the scan triggers another one
+            sig = sig or self.signature()
+            ps4 = find_ps4_controller()
+            ps4_path = ps4.path if ps4 else None
+            if ps4:
+                ps4.close()
+            try:
+                inputs = list_input_devices()
+            except Exception as e:
+                log.error("Error listing input devices: %s", e)
+                inputs = []
+            self.snapshot = {
+                "ps4_path": ps4_path,
+                "input_devices": inputs,
+                "alsa_devices": list_alsa_playback(),
+                "volume": get_volume(),
+            }
+            self._signature = sig
+            self._scanned = time.monotonic()
 
+    def update_volume(self, volume=None):
+        """Store a known mixer level, or re-read it after an output change."""
+        snapshot = dict(self.get())
+        snapshot["volume"] = get_volume() if volume is None else volume
+        self.snapshot = snapshot
+
+
+inventory = HardwareInventory()
+
+
+def hardware_state():
+    """Dashboard payloads for the cached hardware state, keyed by event."""
+    cfg = state["config"]
+    hw = inventory.get()
+    level, max_vol = hw["volume"]
     return {
-        "hourly": {"labels": hourly_labels, "data": hourly_counts},
-        "daily": {"labels": daily_labels, "data": daily_counts},
-        "total": len(history),
-        "today": state["today_count"],
-        "week": week_total,
+        "ps4_status": {
+            "connected": hw["ps4_path"] is not None,
+            "enabled": cfg.get("ps4_vibration", False),
+            "intensity": cfg.get("vibration_intensity", 100),
+        },
+        "input_devices": {
+            "devices": hw["input_devices"],
+            "current": cfg.get("device"),
+        },
+        "alsa_devices": {
+            "devices": hw["alsa_devices"],
+            "current": cfg.get("alsa_device", ""),
+        },
+        "volume": {"level": level, "max": max_vol},
     }
 
 
+def compute_stats():
+    """Boom statistics from the rolling aggregates."""
+    return state["stats"].snapshot(datetime.now())
+
+
+# --- Live level telemetry ---
+
+# Binary frame: uint32 sequence, uint16 count, then one uint16 level per
+# detector block (65535 = full scale), little-endian.
+LEVEL_FRAME_HEADER = struct.Struct("<IH")
+LEVEL_SCALE = 65535
+LEVEL_BACKLOG = 512
+# Unacknowledged frames a client may have before it is skipped
+LEVEL_MAX_IN_FLIGHT = 2
+LEVEL_ACK_TIMEOUT = 5.0
+
+
+class LevelTelemetry:
+    """Batches detector levels into binary frames for subscribed clients.
+
+    The detector worker only appends to a deque, and only while at least
+    one client is subscribed. A publisher thread sends the levels collected
+    since the last tick as one frame per client, level_rate_hz times a
+    second. Each frame must be acknowledged; a client with too many frames
+    in flight is skipped until it catches up, so a slow connection only
+    loses its own updates. Without subscribers the publisher sleeps.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._levels = deque(maxlen=LEVEL_BACKLOG)
+        self._clients = {}  # sid -> [frames in flight, last send time]
+        self._wake = threading.Event()
+        self._thread = None
+        self._seq = 0
+        self.active = False
+        self.frames = 0
+        self.skipped = 0
+
+    def push(self, level):
+        if self.active:
+            self._levels.append(level)
+
+    def subscribe(self, sid):
+        with self._lock:
+            self._clients.setdefault(sid, [0, 0.0])
+            self.active = True
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+        self._wake.set()
+
+    def unsubscribe(self, sid):
+        with self._lock:
+            self._clients.pop(sid, None)
+            if not self._clients:
+                self.active = False
+                self._levels.clear()
+
+    def subscribers(self):
+        return len(self._clients)
+
+    def _ack(self, sid, *args):
+        with self._lock:
+            client = self._clients.get(sid)
+            if client and client[0] > 0:
+                client[0] -= 1
+
+    def _run(self):
+        while True:
+            self._wake.clear()
+            if not self.active:
+                self._wake.wait()
+                continue
+            rate = min(max(float(state["config"].get("level_rate_hz", 10)), 1.0), 60.0)
+            time.sleep(1.0 / rate)
+            try:
+                self._publish()
+            except Exception as e:
+                log.error("Level telemetry error: %s", e)
+
+    def _publish(self):
+        n = len(self._levels)
+        if not n:
+            return
+        levels = np.fromiter((self._levels.popleft() for _ in range(n)), np.float32, n)
+        scaled = (np.clip(levels, 0.0, 1.0) * LEVEL_SCALE + 0.5).astype("<u2")
+        self._seq = (self._seq + 1) & 0xFFFFFFFF
+        frame = LEVEL_FRAME_HEADER.pack(self._seq, n) + scaled.tobytes()
+
+        now = time.monotonic()
+        targets = []
+        with self._lock:
+            for sid, client in self._clients.items():
+                if client[0] >= LEVEL_MAX_IN_FLIGHT:
+                    if now - client[1] < LEVEL_ACK_TIMEOUT:
+                        self.skipped += 1
+                        continue
+                    client[0] = 0  # acks lost; start over
+                client[0] += 1
+                client[1] = now
+                targets.append(sid)
+        for sid in targets:
+            emit("levels", frame, to=sid, callback=functools.partial(self._ack, sid))
+            self.frames += 1
+
+
+telemetry = LevelTelemetry()
+
+
+# --- Metrics ---
+
+class Metric:
+    """A Prometheus metric family: one child per combination of label values.
+
+    Values either live in children updated under a per-family lock (hot
+    paths keep a reference to their child, so an update is no dict lookup
+    and no allocation), or are collected at scrape time by ``fn`` from
+    fields the owner updates itself. ``fn`` returns a value, or
+    {label values tuple: value} for a labelled family. Subclasses define
+    _child() for the first kind and _collected() for both. render() writes
+    the text exposition format.
+    """
+
+    kind = "untyped"
+
+    def __init__(self, name, help, labels=(), fn=None):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labels)
+        self._fn = fn
+        self._lock = threading.Lock()
+        self._children = {}
+        METRICS.append(self)
+
+    def labels(self, **values):
+        key = tuple(str(values[n]) for n in self.labelnames)
+        with self._lock:
+            child = self._children.get(key)
+            if child is None:
+                child = self._children[key] = self._child()
+        return child
+
+    def _label_str(self, key, extra=()):
+        pairs = list(zip(self.labelnames, key)) + list(extra)
+        if not pairs:
+            return ""
+        return "{" + ",".join(f'{n}="{escape_label(v)}"' for n, v in pairs) + "}"
+
+    def samples(self):
+        """[(suffix, label string, value)] for the current values."""
+        if self._fn is not None:
+            try:
+                values = self._fn()
+            except Exception as e:
+                log.debug("Metric %s unavailable: %s", self.name, e)
+                return []
+            if not isinstance(values, dict):
+                values = {(): values}
+            items = [(tuple(str(v) for v in key), value) for key, value in values.items()]
+        else:
+            with self._lock:
+                items = [(key, child.snapshot()) for key, child in self._children.items()]
+        return [s for key, value in items for s in self._collected(key, value)]
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for suffix, labels, value in self.samples():
+            lines.append(f"{self.name}{suffix}{labels} {format_value(value)}")
+        return "\n".join(lines)
+
+
+class _Value:
+    __slots__ = ("value", "_lock")
+
+    def __init__(self, lock):
+        self.value = 0.0
+        self._lock = lock
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+    def set(self, value):
+        self.value = value
+
+    def snapshot(self):
+        return self.value
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name, help, labels=(), fn=None):
+        super().__init__(name + "_total", help, labels, fn)
+
+    def _child(self):
+        return _Value(self._lock)
+
+    def inc(self, amount=1):
+        self.labels().inc(amount)
+
+    def _collected(self, key, value):
+        return [("", self._label_str(key), value)]
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def _child(self):
+        return _Value(self._lock)
+
+    def set(self, value):
+        self.labels().set(value)
+
+    def inc(self, amount=1):
+        self.labels().inc(amount)
+
+    def _collected(self, key, value):
+        return [("", self._label_str(key), value)]
+
+
+class _Buckets:
+    __slots__ = ("bounds", "counts", "sum", "_lock")
+
+    def __init__(self, bounds, lock):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self._lock = lock
+
+    def observe(self, value):
+        i = bisect_left(self.bounds, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += value
+
+    def snapshot(self):
+        return list(self.counts), self.sum
+
+
+class Histogram(Metric):
+    """Histogram over ``buckets`` upper bounds. Collected values (from
+    ``fn``) are (per-bucket counts, sum) with one extra count for +Inf."""
+
+    kind = "histogram"
+
+    def __init__(self, name, help, buckets, labels=(), fn=None):
+        super().__init__(name, help, labels, fn)
+        self.buckets = tuple(buckets)
+
+    def _child(self):
+        return _Buckets(self.buckets, self._lock)
+
+    def observe(self, value):
+        self.labels().observe(value)
+
+    def _collected(self, key, value):
+        counts, total = value
+        out, cumulative = [], 0
+        for bound, n in zip(self.buckets + (float("inf"),), counts):
+            cumulative += n
+            le = "+Inf" if bound == float("inf") else format_value(bound)
+            out.append(("_bucket", self._label_str(key, [("le", le)]), cumulative))
+        out.append(("_sum", self._label_str(key), total))
+        out.append(("_count", self._label_str(key), cumulative))
+        return out
+
+
+def escape_label(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def format_value(value):
+    if isinstance(value, float):
+        if math.isinf(value):
+            return "+Inf" if value > 0 else "-Inf"
+        if value.is_integer() and abs(value) < 1e15:
+            return str(int(value))
+        return repr(value)
+    return str(value)
+
+
+def process_rss():
+    """Resident set size in bytes, from /proc/self/statm."""
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+
+METRICS = []
+
+# The audio callback metrics are plain fields of each CaptureSource, written
+# only by its callback and read here at scrape time, so the real-time thread
+# never takes a lock.
+CALLBACK_BUCKETS = (25e-6, 50e-6, 100e-6, 250e-6, 500e-6, 1e-3, 2.5e-3, 5e-3, 10e-3)
+Histogram("noisyneighbors_audio_callback_seconds", "Time spent in the audio input callback.",
+          CALLBACK_BUCKETS, labels=["device"],
+          fn=lambda: {(s.label,): (list(s.callback_buckets), s.callback_seconds) for s in state["sources"]})
+Counter("noisyneighbors_input_overflows", "Input overflows reported to the audio callback.", labels=["device"],
+        fn=lambda: {(s.label,): s.overruns for s in state["sources"]})
+Counter("noisyneighbors_input_underflows", "Input underflows reported to the audio callback.", labels=["device"],
+        fn=lambda: {(s.label,): s.underruns for s in state["sources"]})
+Gauge("noisyneighbors_block_queue_depth", "Captured blocks waiting for the detector.", labels=["device"],
+      fn=lambda: {(s.label,): len(s.blocks) for s in state["sources"]})
+Gauge("noisyneighbors_boom_queue_depth", "Detected booms waiting for the response pipeline.",
+      fn=lambda: state["boom_queue"].qsize() if state["boom_queue"] else 0)
+RESPONSE_SECONDS = Histogram(
+    "noisyneighbors_response_stage_seconds",
+    "Response stage durations; detect_to_play is the delay from the frame that crossed the threshold "
+    "to the start of playback, including the post-roll.",
+    (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0), labels=["stage"])
+EVENT_STORE_SECONDS = Histogram(
+    "noisyneighbors_event_store_write_seconds", "Time to store a detection in the event database.",
+    (1e-4, 2.5e-4, 5e-4, 1e-3, 2.5e-3, 5e-3, 0.01, 0.025, 0.05, 0.1))
+SOCKETIO_CLIENTS = Gauge("noisyneighbors_socketio_clients", "Connected dashboard clients.")
+SOCKETIO_EMITS = Counter("noisyneighbors_socketio_emits", "Socket.IO messages sent, by event.", labels=["event"])
+Gauge("process_resident_memory_bytes", "Resident memory size in bytes.", fn=process_rss)
+
+
+def emit(event, payload, **kwargs):
+    """socketio.emit, counted per event name."""
+    SOCKETIO_EMITS.labels(event=event).inc()
+    socketio.emit(event, payload, **kwargs)
+
+
 # --- Flask routes ---
 
 @app.route("/")
@@ -371,60 +2424,168 @@ def index():
     return render_template("index.html")
 
 
+RECORDINGS_PAGE_MAX = 200
+
+
 @app.route("/recordings-list")
 def recordings_list():
-    files = []
-    if os.path.exists(RECORDINGS_DIR):
-        for f in sorted(os.listdir(RECORDINGS_DIR), reverse=True)[:100]:
-            if f.endswith(".wav"):
-                size = os.path.getsize(os.path.join(RECORDINGS_DIR, f))
-                files.append({"name": f, "size": size})
-    return jsonify(files)
+    """One page of the recordings index, newest first.
+
+    Query parameters: ``cursor`` (the ``next`` value of the previous page),
+    ``limit``, ``since``/``until`` (epoch seconds) and ``min_rms``.
+    """
+    args = request.args
+    try:
+        limit = min(max(int(args.get("limit", 50)), 1), RECORDINGS_PAGE_MAX)
+        since, until, min_rms = (float(args[k]) if args.get(k) else None
+                                 for k in ("since", "until", "min_rms"))
+    except ValueError:
+        return jsonify({"error": "invalid parameter"}), 400
+    # One extra row tells whether another page follows
+    items = state["events"].recordings(args.get("cursor") or None, limit + 1, since, until, min_rms)
+    more = len(items) > limit
+    del items[limit:]
+    count, size = recordings.totals()
+    return jsonify({
+        "items": items,
+        "next": items[-1]["name"] if more else None,
+        "count": count,
+        "bytes": size,
+    })
+
+
+@app.route("/recording-peaks/<name>")
+def recording_peaks(name):
+    """Waveform min/max peaks of a recording at about ``width`` bins.
+
+    Returns the coarsest precomputed level with at least ``width`` bins:
+    {"sr", "bin_frames", "frames", "peaks": [min0, max0, min1, ...]} with
+    peaks scaled to -128..127.
+    """
+    try:
+        width = min(max(int(request.args.get("width", 200)), 1), 4096)
+    except ValueError:
+        return jsonify({"error": "invalid width"}), 400
+    meta = state["events"].recording(name)
+    found = state["events"].peaks(name, width)
+    if meta is None or found is None:
+        return jsonify({"error": "not found"}), 404
+    level, peaks = found
+    return jsonify({
+        "sr": meta["sr"],
+        "frames": int(round(meta["duration"] * meta["sr"])) if meta["sr"] else 0,
+        "bin_frames": PEAK_BASE << level,
+        "peaks": peaks.ravel().tolist(),
+    })
 
 
 @app.route("/recordings/<path:filename>")
 def serve_recording(filename):
-    return send_from_directory(RECORDINGS_DIR, filename)
+    if not filename.endswith(".nnpc"):
+        return send_from_directory(RECORDINGS_DIR, filename)
+    # Compressed recordings are decoded chunk by chunk into a WAV stream;
+    # a byte range only decodes the chunks it covers.
+    if "/" in filename or "\\" in filename:
+        return "Not found", 404
+    try:
+        reader = RecordingReader(os.path.join(RECORDINGS_DIR, filename))
+    except (OSError, EOFError, struct.error, wave.Error):
+        return "Not found", 404
+    length = 44 + reader.frames * 2
+    start, stop, status = 0, length, 200
+    headers = {
+        "Accept-Ranges": "bytes",
+        "Content-Disposition": f'inline; filename="{filename[:-5]}.wav"',
+    }
+    if request.range is not None:
+        span = request.range.range_for_length(length)
+        if span is None:
+            reader.close()
+            return Response(status=416, headers={"Content-Range": f"bytes */{length}"})
+        start, stop, status = span[0], span[1], 206
+        headers["Content-Range"] = f"bytes {start}-{stop - 1}/{length}"
+    headers["Content-Length"] = str(stop - start)
+
+    def generate():
+        with reader:
+            yield from wav_bytes(reader, start, stop)
+
+    return Response(generate(), status=status, mimetype="audio/wav", headers=headers)
+
+
+@app.route("/metrics")
+def metrics():
+    """Prometheus text exposition of METRICS."""
+    body = "\n".join(m.render() for m in METRICS) + "\n"
+    return Response(body, content_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+@app.route("/audio-stats")
+def audio_stats():
+    sources = [source.stats() for source in state["sources"]]
+    if not sources:
+        return jsonify({})
+    return jsonify({
+        # Totals over all input devices, per-device figures in "sources"
+        "callbacks": sum(s["callbacks"] for s in sources),
+        "overruns": sum(s["overruns"] for s in sources),
+        "status_flags": sum(s["status_flags"] for s in sources),
+        "dropped_blocks": sum(s["dropped_blocks"] for s in sources),
+        "queue_depth": sum(s["queue_depth"] for s in sources),
+        "queue_high_water": max(s["queue_high_water"] for s in sources),
+        "queue_slots": sources[0]["queue_slots"],
+        "sources": sources,
+        "level_subscribers": telemetry.subscribers(),
+        "level_frames": telemetry.frames,
+        "level_frames_skipped": telemetry.skipped,
+        "response": state["pipeline"].timings if state["pipeline"] else {},
+        "recordings": recordings.stats(),
+    })
 
 
-# --- SocketIO handlers ---
+# --- Dashboard state ---
 
-@socketio.on("connect")
-def on_connect():
+# Clients that received a snapshot and get state deltas
+DASHBOARD_ROOM = "dashboard"
+_publish_lock = threading.Lock()
+
+
+def publish(event, payload):
+    """Send a state change to the dashboard room as a versioned delta.
+
+    Each delta bumps state["version"]. Snapshots are taken under the same
+    lock, so a client sees every change after its snapshot exactly once.
+    """
+    with _publish_lock:
+        state["version"] += 1
+        emit(event, dict(payload, version=state["version"]), to=DASHBOARD_ROOM)
+
+
+def set_status(status):
+    state["status"] = status
+    publish("status", {"state": status})
+
+
+def config_state():
     cfg = state["config"]
-    socketio.emit("config", {
+    return {
         "threshold": cfg.get("threshold", 0.15),
         "cooldown_seconds": cfg.get("cooldown_seconds", 5),
         "pre_boom_seconds": cfg.get("pre_boom_seconds", 1.0),
         "post_boom_seconds": cfg.get("post_boom_seconds", 1.5),
-    })
-    socketio.emit("enabled_state", {"enabled": state["enabled"]})
-    socketio.emit("replay_mode", {
-        "mode": cfg.get("replay_mode", "echo"),
-        "available": AVAILABLE_SOUNDS,
-    })
-    # PS4 controller status
-    ps4 = find_ps4_controller()
-    ps4_connected = ps4 is not None
-    if ps4:
-        ps4.close()
-    socketio.emit("ps4_status", {
-        "connected": ps4_connected,
-        "enabled": cfg.get("ps4_vibration", False),
-        "intensity": cfg.get("vibration_intensity", 100),
-    })
-    socketio.emit("input_devices", {
-        "devices": list_input_devices(),
-        "current": cfg.get("device"),
-    })
-    socketio.emit("alsa_devices", {
-        "devices": list_alsa_playback(),
-        "current": cfg.get("alsa_device", ""),
-    })
-    level, max_vol = get_volume()
-    socketio.emit("volume", {"level": level, "max": max_vol})
-    # Extended config (new features)
-    socketio.emit("extended_config", {
+    }
+
+
+def replay_mode_state():
+    return {
+        "mode": state["config"].get("replay_mode", "echo"),
+        "available": available_modes(),
+    }
+
+
+def extended_config_state():
+    cfg = state["config"]
+    return {
         "schedule_enabled": cfg.get("schedule_enabled", False),
         "schedule_start": cfg.get("schedule_start", "22:00"),
         "schedule_end": cfg.get("schedule_end", "08:00"),
@@ -435,20 +2596,80 @@ def on_connect():
         "night_replay_mode": cfg.get("night_replay_mode", "echo"),
         "max_booms_per_hour": cfg.get("max_booms_per_hour", 0),
         "save_recordings": cfg.get("save_recordings", False),
-    })
-    # Today's history
-    if state["today_date"] != str(date.today()):
-        state["today_date"] = str(date.today())
-        state["today_count"] = 0
-    today = str(date.today())
-    today_items = [h for h in state["history"] if h.get("date") == today]
-    state["today_count"] = len(today_items)
-    socketio.emit("history", {
-        "items": list(reversed(today_items[-50:])),
-        "today_count": state["today_count"],
-    })
-    # Stats
-    socketio.emit("stats", compute_stats())
+        "capture_sources": [source.label for source in state["sources"]],
+    }
+
+
+def dashboard_snapshot():
+    """Everything a new dashboard session needs, keyed by event name."""
+    snapshot = {
+        "config": config_state(),
+        "enabled_state": {"enabled": state["enabled"]},
+        "status": {"state": state["status"]},
+        "replay_mode": replay_mode_state(),
+        **hardware_state(),
+        "extended_config": extended_config_state(),
+        "history": {
+            "items": state["events"].since(day_start(date.today()), limit=50),
+            "today_count": state["stats"].today(),
+        },
+        "stats": compute_stats(),
+    }
+    noise = state["noise_floor"]
+    if noise is not None and noise.samples:
+        snapshot["noise_floor"] = noise.snapshot()
+    return snapshot
+
+
+SNAPSHOT_ATTEMPTS = 3
+
+
+def send_snapshot(sid):
+    """Send a snapshot to ``sid`` and add it to the dashboard room.
+
+    The snapshot is built outside _publish_lock (it queries the event store),
+    so publish() from the detector thread never waits for it. If a delta was
+    published in the meantime it is rebuilt; after SNAPSHOT_ATTEMPTS it is
+    sent anyway with the version it was built at, and the client resyncs on
+    the version gap.
+    """
+    for attempt in range(SNAPSHOT_ATTEMPTS):
+        version = state["version"]
+        snapshot = dashboard_snapshot()
+        with _publish_lock:
+            if state["version"] == version or attempt == SNAPSHOT_ATTEMPTS - 1:
+                emit("snapshot", {"version": version, "state": snapshot}, to=sid)
+                join_room(DASHBOARD_ROOM, sid=sid)
+                return
+
+
+# --- SocketIO handlers ---
+
+@socketio.on("connect")
+def on_connect():
+    SOCKETIO_CLIENTS.inc()
+    send_snapshot(request.sid)
+
+
+@socketio.on("get_snapshot")
+def on_get_snapshot():
+    send_snapshot(request.sid)
+
+
+@socketio.on("disconnect")
+def on_disconnect(*args):
+    SOCKETIO_CLIENTS.inc(-1)
+    telemetry.unsubscribe(request.sid)
+
+
+@socketio.on("subscribe_levels")
+def on_subscribe_levels(data=None):
+    telemetry.subscribe(request.sid)
+
+
+@socketio.on("unsubscribe_levels")
+def on_unsubscribe_levels(data=None):
+    telemetry.unsubscribe(request.sid)
 
 
 @socketio.on("save_config")
@@ -468,6 +2689,9 @@ def on_save_config(data):
     cfg["post_boom_seconds"] = post
     save_config(cfg)
     state["config"] = cfg
+    refresh_detector_params()
+    preload_rumble()
+    publish("config", config_state())
     log.info("Config updated from dashboard")
 
 
@@ -475,19 +2699,19 @@ def on_save_config(data):
 def on_set_volume(data):
     level = int(data["level"])
     set_volume(level)
+    inventory.update_volume((level, inventory.get()["volume"][1]))
+    publish("volume", hardware_state()["volume"])
     log.info("Volume set to %d from dashboard", level)
 
 
 @socketio.on("set_replay_mode")
 def on_set_replay_mode(data):
     mode = data["mode"]
-    if mode in AVAILABLE_SOUNDS:
+    if mode in available_modes():
         state["config"]["replay_mode"] = mode
         save_config(state["config"])
-        socketio.emit("replay_mode", {
-            "mode": mode,
-            "available": AVAILABLE_SOUNDS,
-        })
+        refresh_detector_params()
+        publish("replay_mode", replay_mode_state())
         log.info("Replay mode set to '%s' from dashboard", mode)
 
 
@@ -511,7 +2735,7 @@ def on_test_sound():
 @socketio.on("test_vibration")
 def on_test_vibration():
     intensity = state["config"].get("vibration_intensity", 100)
-    threading.Thread(target=vibrate_ps4, args=(1.0, intensity), daemon=True).start()
+    vibrate_ps4(1.0, intensity)
 
 
 @socketio.on("toggle_ps4_vibration")
@@ -519,6 +2743,7 @@ def on_toggle_ps4_vibration(data):
     enabled = bool(data["enabled"])
     state["config"]["ps4_vibration"] = enabled
     save_config(state["config"])
+    publish("ps4_status", hardware_state()["ps4_status"])
     log.info("PS4 vibration %s from dashboard", "enabled" if enabled else "disabled")
 
 
@@ -527,6 +2752,8 @@ def on_set_vibration_intensity(data):
     intensity = int(data["intensity"])
     state["config"]["vibration_intensity"] = intensity
     save_config(state["config"])
+    preload_rumble()
+    publish("ps4_status", hardware_state()["ps4_status"])
     log.info("Vibration intensity set to %d%% from dashboard", intensity)
 
 
@@ -536,10 +2763,7 @@ def on_set_input_device(data):
     state["config"]["device"] = device
     save_config(state["config"])
     state["restart_audio"] = True
-    socketio.emit("input_devices", {
-        "devices": list_input_devices(),
-        "current": device,
-    })
+    publish("input_devices", hardware_state()["input_devices"])
     log.info("Input device set to %d from dashboard, restarting audio...", device)
 
 
@@ -548,10 +2772,10 @@ def on_set_alsa_device(data):
     device = data["device"]
     state["config"]["alsa_device"] = device
     save_config(state["config"])
-    socketio.emit("alsa_devices", {
-        "devices": list_alsa_playback(),
-        "current": device,
-    })
+    inventory.update_volume()
+    hw = hardware_state()
+    publish("alsa_devices", hw["alsa_devices"])
+    publish("volume", hw["volume"])
     log.info("ALSA output device set to '%s' from dashboard", device)
 
 
@@ -562,9 +2786,8 @@ def on_toggle_enabled():
     cb = state.get("cb_state")
     if cb is not None:
         cb["paused"] = not enabled
-    status = "listening" if enabled else "disabled"
-    socketio.emit("enabled_state", {"enabled": enabled})
-    socketio.emit("status", {"state": status})
+    publish("enabled_state", {"enabled": enabled})
+    set_status("listening" if enabled else "disabled")
     log.info("NoisyNeighbors %s from dashboard", "enabled" if enabled else "disabled")
 
 
@@ -575,6 +2798,7 @@ def on_save_schedule(data):
     cfg["schedule_start"] = data.get("start", "22:00")
     cfg["schedule_end"] = data.get("end", "08:00")
     save_config(cfg)
+    publish("extended_config", extended_config_state())
     log.info("Schedule saved: enabled=%s %s-%s",
              cfg["schedule_enabled"], cfg["schedule_start"], cfg["schedule_end"])
 
@@ -590,9 +2814,11 @@ def on_save_night_mode(data):
     except (TypeError, ValueError):
         pass
     mode = data.get("replay_mode", "echo")
-    if mode in AVAILABLE_SOUNDS:
+    if mode in available_modes():
         cfg["night_replay_mode"] = mode
     save_config(cfg)
+    refresh_detector_params()
+    publish("extended_config", extended_config_state())
     log.info("Night mode saved: enabled=%s %s-%s", cfg["night_mode_enabled"],
              cfg["night_mode_start"], cfg["night_mode_end"])
 
@@ -605,6 +2831,7 @@ def on_save_limits(data):
     except (TypeError, ValueError):
         pass
     save_config(cfg)
+    publish("extended_config", extended_config_state())
     log.info("Limits saved: max_booms_per_hour=%d", cfg["max_booms_per_hour"])
 
 
@@ -613,203 +2840,498 @@ def on_set_save_recordings(data):
     cfg = state["config"]
     cfg["save_recordings"] = bool(data.get("enabled", False))
     save_config(cfg)
+    publish("extended_config", extended_config_state())
     log.info("Save recordings: %s", cfg["save_recordings"])
 
 
 @socketio.on("calibrate_threshold")
 def on_calibrate_threshold():
-    if state["calibrating"]:
+    # The noise floor is tracked continuously, so calibration is immediate
+    # and detection keeps running.
+    noise = state["noise_floor"]
+    if noise is None or noise.samples < 10:
+        emit("calibration_done", {"error": "Not enough audio samples"}, to=request.sid)
         return
-    state["calibration_samples"] = []
-    state["calibrating"] = True
-    socketio.emit("calibration_started", {"duration": 5})
-    log.info("Threshold calibration started (5s)")
-
-    def _finish():
-        time.sleep(5)
-        state["calibrating"] = False
-        samples = state["calibration_samples"]
-        if len(samples) < 10:
-            socketio.emit("calibration_done", {"error": "Not enough audio samples"})
-            return
-        mean = float(np.mean(samples))
-        std = float(np.std(samples))
-        new_threshold = round(float(np.clip(mean + 3 * std, 0.01, 1.0)), 4)
-        state["config"]["threshold"] = new_threshold
-        save_config(state["config"])
-        socketio.emit("calibration_done", {"threshold": new_threshold})
-        log.info("Calibrated threshold: %.4f (mean=%.4f, std=%.4f)", new_threshold, mean, std)
-
-    threading.Thread(target=_finish, daemon=True).start()
+    mean, std = noise.mean, noise.std
+    new_threshold = round(float(np.clip(mean + 3 * std, 0.01, 1.0)), 4)
+    state["config"]["threshold"] = new_threshold
+    save_config(state["config"])
+    refresh_detector_params()
+    emit("calibration_done", {"threshold": new_threshold}, to=request.sid)
+    publish("config", config_state())
+    log.info("Calibrated threshold: %.4f (mean=%.4f, std=%.4f)", new_threshold, mean, std)
 
 
 @socketio.on("get_stats")
 def on_get_stats():
-    socketio.emit("stats", compute_stats())
+    emit("stats", compute_stats(), to=request.sid)
 
 
 @socketio.on("delete_recording")
 def on_delete_recording(data):
     filename = data.get("name", "")
-    if not filename.endswith(".wav") or "/" in filename or "\\" in filename:
+    if not filename.endswith(RECORDING_EXTS) or "/" in filename or "\\" in filename:
         return
-    path = os.path.join(RECORDINGS_DIR, filename)
-    if os.path.exists(path):
-        os.unlink(path)
+    if recordings.delete(filename):
         log.info("Deleted recording: %s", filename)
-        socketio.emit("recording_deleted", {"name": filename})
 
 
-# --- Audio detection thread ---
+# --- Response pipeline ---
+
+RESPONSE_WORKERS = 4
+
+# One detected event, handed from the capture loop to the response stages.
+# ``triggered`` is the perf_counter() time of the frame that crossed the
+# threshold; ``logged`` is a Future resolved with the event id once stored.
+BoomEvent = namedtuple("BoomEvent", [
+    "audio", "sr", "when", "rms", "duration", "limit_reached",
+    "hourly_count", "max_per_hour", "replay_mode", "alsa_device", "out_sr", "triggered",
+    "source", "logged",
+])
+
+# How long a correlated detection waits for the first one to be stored
+CORRELATE_TIMEOUT = 10.0
+
+
+class ResponsePipeline:
+    """Runs the response to a detected boom as concurrent stages.
+
+    submit() returns at once: logging, vibration and playback run on a
+    bounded thread pool, recordings go to the RecordingStore writer, and
+    the cooldown is a timer started when playback ends, after which
+    ``resume`` re-arms detection. close() cancels a pending cooldown and
+    queued stages, so an audio restart never waits for a response to
+    finish. Per-stage durations (and the delay from the trigger frame to
+    the start of playback) are kept in ``timings``.
+    """
+
+    def __init__(self, resume, workers=RESPONSE_WORKERS):
+        self._resume = resume
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="response")
+        self._lock = threading.Lock()
+        self._timer = None
+        self._closed = False
+        self.timings = {}
+
+    def _record(self, stage, seconds):
+        with self._lock:
+            t = self.timings.setdefault(stage, {"count": 0, "last_ms": 0.0, "max_ms": 0.0, "total_ms": 0.0})
+            ms = seconds * 1000
+            t["count"] += 1
+            t["last_ms"] = ms
+            t["max_ms"] = max(t["max_ms"], ms)
+            t["total_ms"] += ms
+        RESPONSE_SECONDS.labels(stage=stage).observe(seconds)
+
+    def _stage(self, name, fn, *args):
+        start = time.perf_counter()
+        try:
+            fn(*args)
+        except Exception as e:
+            log.error("Response stage '%s' failed: %s", name, e)
+        finally:
+            self._record(name, time.perf_counter() - start)
 
-def audio_loop():
-    cfg = state["config"]
-    channels = cfg["channels"]
-    device = cfg["device"]
-    alsa_device = cfg.get("alsa_device") or None
-    out_sr = cfg.get("output_sample_rate", 48000)
+    def submit(self, event):
+        if self._closed:
+            return
+        self._pool.submit(self._stage, "log", self._log, event)
+        if event.limit_reached:
+            self._resume()
+            return
+        log.info("Playing boom (%.2fs, mode=%s)...", event.duration, event.replay_mode)
+        set_status("boom")
+        if state["config"].get("ps4_vibration", False):
+            self._pool.submit(self._stage, "vibrate", vibrate_ps4,
+                              event.duration, state["config"].get("vibration_intensity", 100))
+        self._pool.submit(self._playback, event)
+
+    def correlate(self, event, source, level):
+        """Record that ``source`` also heard ``event``, without responding again."""
+        if not self._closed:
+            self._pool.submit(self._stage, "correlate", self._correlate, event, source, level)
+
+    @staticmethod
+    def _log(event):
+        try:
+            event_id = log_event(event)
+        except Exception as e:
+            event.logged.set_exception(e)
+            raise
+        event.logged.set_result(event_id)
+        if state["config"].get("save_recordings", False):
+            recordings.submit(event.audio, event.sr, event.when, event_id)
+
+    @staticmethod
+    def _correlate(event, source, level):
+        event_id = event.logged.result(timeout=CORRELATE_TIMEOUT)
+        heard_by = state["events"].add_source(event_id, source)
+        publish("boom_source", {"id": event_id, "source": source, "rms": level, "heard_by": heard_by})
+
+    def _playback(self, event):
+        self._record("detect_to_play", time.perf_counter() - event.triggered)
+        try:
+            if event.replay_mode == "echo":
+                self._stage("playback", play_audio, event.audio, event.sr, event.alsa_device, event.out_sr)
+            else:
+                self._stage("playback", play_sound_file, event.replay_mode, event.alsa_device, event.out_sr)
+            log.info("Playback finished")
+        finally:
+            self._start_cooldown()
+
+    def _start_cooldown(self):
+        # Read at the end of playback so a changed setting applies right away
+        cooldown = state["detector_params"].cooldown
+        with self._lock:
+            if self._closed:
+                return
+            if cooldown <= 0:
+                self._timer = None
+            else:
+                log.info("Cooldown %ds...", cooldown)
+                set_status("cooldown")
+                self._timer = threading.Timer(cooldown, self._resume)
+                self._timer.daemon = True
+                self._timer.start()
+                return
+        self._resume()
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            if self._timer is not None:
+                self._timer.cancel()
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+
+def log_event(event):
+    """Store a detection and notify the dashboard. Returns the event id."""
+    detection = {
+        "date": str(event.when.date()),
+        "time": event.when.strftime("%H:%M:%S"),
+        "rms": event.rms,
+        "duration": event.duration,
+        "source": event.source,
+    }
+    start = time.perf_counter()
+    event_id = state["events"].add(detection, event.when.timestamp())
+    EVENT_STORE_SECONDS.observe(time.perf_counter() - start)
+    state["stats"].add(event.when)
+    publish("boom", {
+        "id": event_id,
+        "source": event.source,
+        "time": detection["time"],
+        "rms": event.rms,
+        "duration": event.duration,
+        "today_count": state["stats"].today(),
+        "limit_reached": event.limit_reached,
+        "hourly_count": event.hourly_count,
+        "max_per_hour": event.max_per_hour,
+    })
+    return event_id
 
-    if alsa_device is None:
-        alsa_device = detect_alsa_device()
-        cfg["alsa_device"] = alsa_device
-        save_config(cfg)
-        log.info("Auto-detected ALSA output: %s", alsa_device)
 
-    if device is None:
-        idx, dev_info = detect_device()
-        if idx is not None:
+# --- Audio detection thread ---
+
+# Detections on other mics that triggered before the first one's post-roll
+# ended (plus this much clock slack) are the same boom
+CORRELATION_SLACK = 0.25
+
+
+def capture_specs(cfg):
+    """Input devices to capture from, as dicts with at least "device".
+
+    ``capture_devices`` entries are a device index or name, or a dict with
+    "device" and optional "label", "threshold", "sample_rate" and
+    "channels". Without it, the single ``device`` (or the first USB input)
+    is used. Every spec gets a unique "label", by default the device name
+    (identical mics get " #2", " #3"...). Returns [] if nothing can be found.
+    """
+    specs = [dict(e) if isinstance(e, dict) else {"device": e}
+             for e in cfg.get("capture_devices") or []]
+    if not specs:
+        device = cfg["device"]
+        if device is None:
+            idx, dev_info = detect_device()
+            if idx is None:
+                return []
             device = idx
             log.info("Auto-detected device: [%d] %s", idx, dev_info["name"])
-        else:
-            log.error("No USB device detected.")
+        specs = [{"device": device}]
+    taken = set()
+    for spec in specs:
+        base = str(spec.get("label") or sd.query_devices(spec["device"])["name"])
+        label, n = base, 1
+        while label in taken:
+            n += 1
+            label = f"{base} #{n}"
+        taken.add(label)
+        spec["label"] = label
+    return specs
+
+
+class CaptureSource:
+    """One input device with its own stream, ring buffer and detector.
+
+    The stream callback only hands blocks to this source's worker thread,
+    which runs the detector with the device's own threshold and noise
+    floor. Finished events (post-roll captured) go to the shared ``booms``
+    queue as (source, start, end, trigger time). Detection is paused for
+    all sources at once through the shared ``cb_state`` when the main loop
+    starts a response; an event that only correlates with it pauses nothing.
+    """
+
+    def __init__(self, spec, cfg, cb_state, booms, primary=False):
+        self.device = spec["device"]
+        dev_info = sd.query_devices(self.device)
+        self.name = dev_info["name"]
+        self.label = spec["label"]
+        self.threshold = spec.get("threshold")
+        sr = spec.get("sample_rate") or cfg.get("sample_rate")
+        if not sr:
+            sr = int(dev_info["default_samplerate"])
+            log.info("Auto-detected sample rate for %s: %d Hz", self.label, sr)
+        self.sr = int(sr)
+        self.channels = spec.get("channels") or cfg["channels"]
+        self.primary = primary
+        self.cb_state = cb_state
+        self.booms = booms
+        self.ring = RingBuffer(int(self.sr * RING_SECONDS), self.channels)
+        self.detector = make_detector(cfg, self.sr)
+        self.noise = NoiseFloorTracker()
+        self.blocks = BlockQueue(BLOCK_QUEUE_SLOTS, BLOCK_SIZE, self.channels)
+        self.callbacks = 0
+        self.overruns = 0
+        self.status_flags = 0
+        self.underruns = 0
+        # Callback duration histogram (CALLBACK_BUCKETS, plus +Inf)
+        self.callback_buckets = [0] * (len(CALLBACK_BUCKETS) + 1)
+        self.callback_seconds = 0.0
+        self.pending = None  # (start, end, trigger perf_counter) of the event being captured
+        self._block_counter = 0
+        self._skipped = False
+        self._shared_params = None
+        self._params = None
+        self._stop = threading.Event()
+
+    def params(self):
+        """Detector parameters for this device's sample rate and threshold,
+        rebuilt whenever the shared ones are replaced."""
+        shared = state["detector_params"]
+        if shared is not self._shared_params:
+            cfg = state["config"]
+            if self.threshold is not None:
+                cfg = dict(cfg, threshold=self.threshold)
+            self._params = build_detector_params(cfg, self.sr)
+            self._shared_params = shared
+        return self._params
+
+    def callback(self, indata, frames, time_info, status):
+        # Real-time thread: only hand the block off to the detector worker.
+        start = time.perf_counter()
+        self.callbacks += 1
+        if status:
+            self.status_flags += 1
+            if status.input_overflow:
+                self.overruns += 1
+            if status.input_underflow:
+                self.underruns += 1
+        self.blocks.push(indata)
+        elapsed = time.perf_counter() - start
+        self.callback_buckets[bisect_left(CALLBACK_BUCKETS, elapsed)] += 1
+        self.callback_seconds += elapsed
+
+    def process_block(self, block):
+        ring = self.ring
+        # Continuous capture: the ring keeps filling while paused so the
+        # next event always has its full pre-roll.
+        ring.write(block)
+
+        # Pending event: wait until its post-roll is in the ring
+        if self.pending is not None:
+            start, end, triggered = self.pending
+            if ring.total >= end:
+                self.booms.put((self, start, end, triggered))
+                self.pending = None
+            self._skipped = True
             return
 
-    dev_info = sd.query_devices(device)
-    sr = cfg.get("sample_rate")
-    if sr is None or sr == 0:
-        sr = int(dev_info["default_samplerate"])
-        log.info("Auto-detected sample rate: %d Hz", sr)
+        if self.cb_state["paused"]:
+            self._skipped = True
+            return
 
-    block_size = 1024
-    boom_queue = queue.Queue()
+        if self._skipped:
+            # The detector last saw the audio from before the pause (usually
+            # the boom itself), which would trigger again at once
+            self.detector.reset()
+            self._skipped = False
+
+        params = self.params()
+        threshold = params.threshold
+        if params.adaptive and self.noise.threshold is not None:
+            threshold = self.noise.threshold
+
+        level, offset = self.detector.detect(block, threshold)
+        if offset is None:
+            self.noise.update(level, len(block) / self.sr)
+
+        self._block_counter += 1
+        if self.primary:
+            telemetry.push(level)
+            if self._block_counter % NOISE_FLOOR_EVERY == 0:
+                self.noise.refresh(params)
+                emit("noise_floor", self.noise.snapshot(), to=DASHBOARD_ROOM)
+        elif self._block_counter % NOISE_FLOOR_EVERY == 0:
+            self.noise.refresh(params)
+
+        if offset is not None:
+            # Align pre/post-roll on the exact frame that crossed the threshold
+            trigger = ring.total - len(block) + offset
+            log.info("BOOM detected on %s! RMS=%.4f (threshold=%.4f)", self.label, level, threshold)
+            set_status("boom")
+            triggered = time.perf_counter() - (ring.total - trigger) / self.sr
+            self.pending = (trigger - params.pre_samples, trigger + params.post_samples, triggered)
+
+    def _run(self):
+        """Worker thread: drain the block queue and run detection."""
+        blocks = self.blocks
+        poll = BLOCK_SIZE / self.sr / 2
+        reported = {"overruns": 0, "dropped": 0}
+        while not self._stop.is_set():
+            block = blocks.pop()
+            if block is None:
+                if self.overruns != reported["overruns"]:
+                    reported["overruns"] = self.overruns
+                    log.warning("Audio status on %s: input overflow (%d total)", self.label, self.overruns)
+                if blocks.dropped != reported["dropped"]:
+                    reported["dropped"] = blocks.dropped
+                    log.warning("Detector for %s fell behind, %d blocks dropped", self.label, blocks.dropped)
+                time.sleep(poll)
+                continue
+            try:
+                self.process_block(block)
+            except Exception as e:
+                log.error("Error in detector for %s: %s", self.label, e)
+            finally:
+                blocks.release()
 
-    cb_state = {
-        "write_pos": 0,
-        "boom_detected": False,
-        "post_recorded": 0,
-        "paused": not state["enabled"],
-        "post_recording": None,
-    }
-    state["cb_state"] = cb_state
+    def start(self):
+        threading.Thread(target=self._run, daemon=True, name=f"detector-{self.label}").start()
 
-    def get_cfg_values():
-        c = state["config"]
-        try:
-            t = float(c.get("threshold") or 0.15)
-            # Night mode: use night threshold if in night window
-            if c.get("night_mode_enabled", False):
-                nt = c.get("night_threshold")
-                if nt and is_in_time_range(
-                    c.get("night_mode_start", "22:00"),
-                    c.get("night_mode_end", "08:00")
-                ):
-                    t = float(nt)
-            pre = int(sr * float(c.get("pre_boom_seconds") or 1.0))
-            post = int(sr * float(c.get("post_boom_seconds") or 1.5))
-            cd = float(c.get("cooldown_seconds") or 5)
-        except (TypeError, ValueError):
-            t, pre, post, cd = 0.15, int(sr * 1.0), int(sr * 1.5), 5
-        return t, pre, post, cd
+    def stop(self):
+        self._stop.set()
 
-    buffer_len = int(sr * 3)
-    ring = np.zeros((buffer_len, channels), dtype=np.float32)
-    rms_counter = 0
+    def stream(self):
+        return sd.InputStream(
+            samplerate=self.sr,
+            channels=self.channels,
+            dtype="float32",
+            blocksize=BLOCK_SIZE,
+            device=self.device,
+            callback=self.callback,
+        )
 
-    def callback(indata, frames, time_info, status):
-        nonlocal rms_counter
-        s = cb_state
+    def stats(self):
+        return {
+            "label": self.label,
+            "device": self.device,
+            "sample_rate": self.sr,
+            "callbacks": self.callbacks,
+            "overruns": self.overruns,
+            "status_flags": self.status_flags,
+            "dropped_blocks": self.blocks.dropped,
+            "queue_depth": len(self.blocks),
+            "queue_high_water": self.blocks.high_water,
+            "queue_slots": self.blocks.n_slots,
+        }
 
-        try:
-            if status:
-                log.warning("Audio status: %s", status)
 
-            # Calibration mode: collect ambient RMS samples
-            if state["calibrating"]:
-                state["calibration_samples"].append(float(rms(indata)))
-                return
+def audio_loop():
+    cfg = state["config"]
+    alsa_device = cfg.get("alsa_device") or None
+    out_sr = cfg.get("output_sample_rate", 48000)
 
-            if s["paused"]:
-                return
+    if alsa_device is None:
+        alsa_device = detect_alsa_device()
+        cfg["alsa_device"] = alsa_device
+        save_config(cfg)
+        log.info("Auto-detected ALSA output: %s", alsa_device)
 
-            threshold, pre_samples, post_samples, _ = get_cfg_values()
-
-            if s["boom_detected"]:
-                remaining = post_samples - s["post_recorded"]
-                to_copy = min(frames, remaining)
-                s["post_recording"][s["post_recorded"]:s["post_recorded"] + to_copy] = indata[:to_copy]
-                s["post_recorded"] += to_copy
-
-                if s["post_recorded"] >= post_samples:
-                    s["boom_detected"] = False
-                    pre_start = (s["write_pos"] - pre_samples) % buffer_len
-                    if pre_start < s["write_pos"]:
-                        pre_audio = ring[pre_start:s["write_pos"]].copy()
-                    else:
-                        pre_audio = np.concatenate([ring[pre_start:], ring[:s["write_pos"]]])
-                    boom_audio = np.concatenate([pre_audio, s["post_recording"]])
-                    s["paused"] = True
-                    boom_queue.put(boom_audio)
-                return
+    specs = capture_specs(cfg)
+    if not specs:
+        log.error("No USB device detected.")
+        return
+
+    boom_queue = queue.Queue()
+    state["boom_queue"] = boom_queue
+    cb_state = {"paused": not state["enabled"]}
+    state["cb_state"] = cb_state
 
-            for i in range(frames):
-                ring[s["write_pos"]] = indata[i]
-                s["write_pos"] = (s["write_pos"] + 1) % buffer_len
+    sources = [CaptureSource(spec, cfg, cb_state, boom_queue, primary=(i == 0))
+               for i, spec in enumerate(specs)]
+    # The first device drives the dashboard level meter and noise floor
+    state["sample_rate"] = sources[0].sr
+    refresh_detector_params()
+    preload_rumble()
+    state["noise_floor"] = sources[0].noise
+    state["sources"] = sources
+    publish("extended_config", extended_config_state())
 
-            level = rms(indata)
+    def resume():
+        cb_state["paused"] = not state["enabled"]
+        set_status("listening" if state["enabled"] else "disabled")
+        log.info("Listening resumed (enabled=%s)", state["enabled"])
 
-            rms_counter += 1
-            if rms_counter % 5 == 0:
-                socketio.emit("rms", {"level": float(level)})
+    pipeline = ResponsePipeline(resume)
+    state["pipeline"] = pipeline
 
-            if level > threshold:
-                log.info("BOOM detected! RMS=%.4f (threshold=%.4f)", level, threshold)
-                socketio.emit("status", {"state": "boom"})
-                s["boom_detected"] = True
-                s["post_recording"] = np.zeros((post_samples, channels), dtype=np.float32)
-                s["post_recorded"] = 0
-        except Exception as e:
-            log.error("Error in audio callback: %s", e)
+    for source in sources:
+        source.start()
 
     log.info("NoisyNeighbors started")
-    log.info("  device=[%s] %s", device, dev_info["name"])
-    log.info("  alsa_device=%s  sr=%d  out_sr=%d  channels=%d",
-             alsa_device, sr, out_sr, channels)
+    for source in sources:
+        log.info("  device=[%s] %s  label=%s  sr=%d  channels=%d  detector=%s",
+                 source.device, source.name, source.label, source.sr, source.channels,
+                 source.detector.name)
+    log.info("  alsa_device=%s  out_sr=%d", alsa_device, out_sr)
+
+    # Latest response: (boom event, end of its post-roll as epoch time, source)
+    last = None
 
     try:
-        with sd.InputStream(
-            samplerate=sr,
-            channels=channels,
-            dtype="float32",
-            blocksize=block_size,
-            device=device,
-            callback=callback,
-        ):
+        with ExitStack() as streams:
+            for source in sources:
+                streams.enter_context(source.stream())
             log.info("Listening... (Ctrl+C to stop)")
             while True:
                 if state["restart_audio"]:
                     log.info("Audio restart requested")
                     return
                 try:
-                    boom_audio = boom_queue.get(timeout=0.1)
+                    source, boom_start, boom_end, triggered = boom_queue.get(timeout=0.1)
                 except queue.Empty:
                     continue
+                trigger_ts = time.time() - (time.perf_counter() - triggered)
+
+                ring = source.ring
+                boom_audio = ring.read(boom_start, boom_end - boom_start).copy()
+                if ring.total - boom_start > ring.capacity:
+                    log.warning("Boom audio partially overwritten before extraction")
 
                 if boom_audio.ndim == 2 and boom_audio.shape[1] == 1:
                     boom_audio = boom_audio.flatten()
 
+                sr = source.sr
                 duration = len(boom_audio) / sr
                 boom_rms = float(rms(boom_audio))
-                now = datetime.now()
+
+                if last is not None and trigger_ts <= last[1] and source is not last[2]:
+                    log.info("Same boom heard on %s (RMS=%.4f)", source.label, boom_rms)
+                    pipeline.correlate(last[0], source.label, boom_rms)
+                    continue
+
+                # Stamped at the trigger, not now (after the post-roll)
+                now = datetime.fromtimestamp(trigger_ts)
 
                 # Hourly rate limit
                 if now.hour != state["current_hour"]:
@@ -824,84 +3346,156 @@ def audio_loop():
                     state["hourly_boom_count"] += 1
 
                 # Determine effective replay mode (night mode override)
-                cur_alsa = state["config"].get("alsa_device") or alsa_device
-                replay_mode = state["config"].get("replay_mode", "echo")
-                if state["config"].get("night_mode_enabled", False):
-                    nm_start = state["config"].get("night_mode_start", "22:00")
-                    nm_end = state["config"].get("night_mode_end", "08:00")
-                    if is_in_time_range(nm_start, nm_end):
-                        replay_mode = state["config"].get("night_replay_mode", replay_mode)
-                        log.info("Night mode active, using replay_mode=%s", replay_mode)
-
-                if not limit_reached:
-                    log.info("Playing boom (%.2fs, mode=%s)...", duration, replay_mode)
-                    socketio.emit("status", {"state": "boom"})
-
-                    # PS4 vibration in parallel
-                    if state["config"].get("ps4_vibration", False):
-                        intensity = state["config"].get("vibration_intensity", 100)
-                        threading.Thread(
-                            target=vibrate_ps4,
-                            args=(duration, intensity),
-                            daemon=True,
-                        ).start()
-
-                    if replay_mode == "echo":
-                        play_audio(boom_audio, sr, cur_alsa, out_sr)
-                    else:
-                        play_sound_file(replay_mode, cur_alsa)
-                    log.info("Playback finished")
-
-                # Save recording if enabled
-                if state["config"].get("save_recordings", False):
-                    threading.Thread(
-                        target=save_recording,
-                        args=(boom_audio.copy(), sr),
-                        daemon=True,
-                    ).start()
-
-                # Log detection
-                detection = {
-                    "date": str(now.date()),
-                    "time": now.strftime("%H:%M:%S"),
-                    "rms": boom_rms,
-                    "duration": duration,
-                }
-                state["history"].append(detection)
-                save_history(state["history"])
-
-                if state["today_date"] != str(now.date()):
-                    state["today_date"] = str(now.date())
-                    state["today_count"] = 0
-                state["today_count"] += 1
-
-                socketio.emit("boom", {
-                    "time": detection["time"],
-                    "rms": boom_rms,
-                    "duration": duration,
-                    "today_count": state["today_count"],
-                    "limit_reached": limit_reached,
-                    "hourly_count": state["hourly_boom_count"],
-                    "max_per_hour": max_per_hour,
-                })
-
-                if not limit_reached:
-                    _, _, _, cooldown = get_cfg_values()
-                    if cooldown > 0:
-                        log.info("Cooldown %ds...", cooldown)
-                        socketio.emit("status", {"state": "cooldown"})
-                        time.sleep(cooldown)
-
-                cb_state["paused"] = not state["enabled"]
-                status_str = "listening" if state["enabled"] else "disabled"
-                socketio.emit("status", {"state": status_str})
-                log.info("Listening resumed (enabled=%s)", state["enabled"])
+                params = state["detector_params"]
+                if params.night_active:
+                    log.info("Night mode active, using replay_mode=%s", params.replay_mode)
+
+                event = BoomEvent(
+                    audio=boom_audio,
+                    sr=sr,
+                    when=now,
+                    rms=boom_rms,
+                    duration=duration,
+                    limit_reached=limit_reached,
+                    hourly_count=state["hourly_boom_count"],
+                    max_per_hour=max_per_hour,
+                    replay_mode=params.replay_mode,
+                    alsa_device=state["config"].get("alsa_device") or alsa_device,
+                    out_sr=out_sr,
+                    triggered=triggered,
+                    source=source.label,
+                    logged=Future(),
+                )
+                last = (event, trigger_ts + source.params().post_samples / sr + CORRELATION_SLACK, source)
+                # Only a response pauses detection; the pipeline resumes it
+                cb_state["paused"] = True
+                pipeline.submit(event)
 
     except KeyboardInterrupt:
         log.info("Shutdown requested")
     except Exception as e:
         log.error("Error: %s", e)
         raise
+    finally:
+        for source in sources:
+            source.stop()
+        pipeline.close()
+
+
+# --- Offline analysis ---
+
+def analyze_file(path, thresholds, cfg, response_seconds=None):
+    """Run the detector over one recording for each threshold.
+
+    The file is decoded and analyzed in chunks of whole detector blocks, so
+    memory use does not depend on its length. ``response_seconds`` maps a
+    threshold to the length of the canned sound played in response; missing
+    thresholds are assumed to replay the echo.
+    Returns (path, duration, {threshold: [trigger times in seconds]}).
+    """
+    with RecordingReader(path) as reader:
+        sr = reader.sr
+        detector = make_detector(cfg, sr)
+        all_levels, all_ends = [], []
+        pending = np.zeros(0, dtype=np.float32)
+        done = 0
+        for chunk in reader:
+            pending = np.concatenate([pending, chunk.astype(np.float32) / 32768])
+            n = len(pending) // BLOCK_SIZE * BLOCK_SIZE
+            if n:
+                levels, ends = detector.levels(pending[:n])
+                all_levels.append(levels)
+                all_ends.append(ends + done)
+                done += n
+                pending = pending[n:]
+        if len(pending) and isinstance(detector, SlidingRmsDetector):
+            # The sliding window also covers a trailing partial block
+            levels, ends = detector.levels(pending)
+            all_levels.append(levels)
+            all_ends.append(ends + done)
+        frames = reader.frames
+    params = build_detector_params(dict(cfg, night_mode_enabled=False), sr)
+    response_seconds = response_seconds or {}
+    levels = np.concatenate(all_levels) if all_levels else np.zeros(0)
+    ends = np.concatenate(all_ends) if all_ends else np.zeros(0, dtype=np.int64)
+    detections = {}
+    for t in thresholds:
+        # Detection is off during post-roll, the response and the cooldown
+        seconds = response_seconds.get(t)
+        response = params.pre_samples + params.post_samples if seconds is None else int(seconds * sr)
+        hold = params.post_samples + response + int(params.cooldown * sr)
+        detections[t] = [at / sr for at in find_triggers(levels, ends, t, hold)]
+    return path, frames / sr, detections
+
+
+def analyze(argv):
+    import argparse
+    from concurrent.futures import ProcessPoolExecutor
+
+    parser = argparse.ArgumentParser(
+        prog="noisyneighbors.py --analyze",
+        description="Run the boom detector over recordings faster than real time.",
+    )
+    parser.add_argument("paths", nargs="+", help="WAV/NNPC files or directories of them")
+    parser.add_argument("--threshold", default=None,
+                        help="comma-separated thresholds to sweep (default: config threshold)")
+    parser.add_argument("--jobs", type=int, default=None, help="worker processes")
+    parser.add_argument("--verbose", action="store_true", help="list every detection")
+    args = parser.parse_args(argv)
+
+    cfg = load_config()
+    mode = cfg.get("replay_mode", "echo")
+    if args.threshold:
+        thresholds = [float(t) for t in args.threshold.split(",")]
+        modes = {t: mode for t in thresholds}
+    else:
+        thresholds = [float(cfg.get("threshold") or 0.15)]
+        modes = {thresholds[0]: mode}
+        if cfg.get("night_mode_enabled", False) and cfg.get("night_threshold"):
+            thresholds.append(float(cfg["night_threshold"]))
+            modes[thresholds[-1]] = cfg.get("night_replay_mode", mode)
+    # The hold after a detection depends on how long the response plays
+    sound_bank.scan(cfg.get("output_sample_rate", 48000))
+    response_seconds = {}
+    for t, m in modes.items():
+        if m != "echo":
+            audio = sound_bank.get(m)
+            response_seconds[t] = 0.0 if audio is None else len(audio) / sound_bank.out_sr
+
+    files = []
+    for p in args.paths:
+        if os.path.isdir(p):
+            files.extend(os.path.join(p, f) for f in sorted(os.listdir(p)) if f.endswith(RECORDING_EXTS))
+        else:
+            files.append(p)
+    if not files:
+        print("No recordings found")
+        return
+
+    started = time.time()
+    if len(files) == 1:
+        results = [analyze_file(files[0], thresholds, cfg, response_seconds)]
+    else:
+        with ProcessPoolExecutor(max_workers=args.jobs) as pool:
+            results = list(pool.map(analyze_file, files, [thresholds] * len(files), [cfg] * len(files),
+                                    [response_seconds] * len(files)))
+    elapsed = time.time() - started
+
+    total_audio = sum(r[1] for r in results)
+    print(f"\n=== Offline analysis: {len(files)} file(s), "
+          f"{timedelta(seconds=int(total_audio))} of audio in {elapsed:.1f}s ===\n")
+    header = "".join(f"{t:>10.4f}" for t in thresholds)
+    print(f"  {'file':<40}{header}")
+    for path, duration, detections in results:
+        counts = "".join(f"{len(detections[t]):>10d}" for t in thresholds)
+        print(f"  {os.path.basename(path)[:40]:<40}{counts}")
+        if args.verbose:
+            for t in thresholds:
+                for at in detections[t]:
+                    print(f"      threshold={t:.4f}  boom at {at:8.2f}s")
+    totals = "".join(f"{sum(len(r[2][t]) for r in results):>10d}" for t in thresholds)
+    print(f"  {'TOTAL':<40}{totals}")
+    print()
 
 
 def main():
@@ -909,15 +3503,22 @@ def main():
         list_devices()
         return
 
+    if "--analyze" in sys.argv:
+        analyze(sys.argv[sys.argv.index("--analyze") + 1:])
+        return
+
     os.makedirs(RECORDINGS_DIR, exist_ok=True)
 
     cfg = load_config()
     state["config"] = cfg
-    state["history"] = load_history()
-
-    today = str(date.today())
-    state["today_date"] = today
-    state["today_count"] = len([h for h in state["history"] if h.get("date") == today])
+    state["events"] = EventStore(EVENTS_PATH)
+    state["events"].migrate_json(HISTORY_PATH)
+    sound_bank.scan(cfg.get("output_sample_rate", 48000))
+    inventory.refresh()
+    if controller.attach(inventory.get()["ps4_path"]):
+        preload_rumble()
+    state["stats"] = StatsAggregator(state["events"])
+    recordings.start()
 
     # Start scheduler thread
     threading.Thread(target=scheduler_loop, daemon=True).start()